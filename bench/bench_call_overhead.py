@@ -0,0 +1,79 @@
+'''
+Micro-benchmark of the per-call overhead of a `@sync_compatible` function
+
+Compares `await f(x)` against awaiting the raw coroutine function, and `f(x).wait()` against calling
+the sync function directly. Run it via `python bench/bench_call_overhead.py`, or as part of `python bench/run.py`.
+'''
+
+import timeit
+from collections.abc import Awaitable, Callable
+from typing import Any
+from easy_sync import sync_compatible
+
+N = 200_000
+REPEAT = 5
+
+
+def sync_add(a: int, b: int) -> int:
+    return a + b
+
+async def async_add(a: int, b: int) -> int:
+    return a + b
+
+wrapped_add = sync_compatible(sync_fn=sync_add)(async_add)
+
+
+def drive(coro: Any) -> Any:
+    ''' run a coroutine which never suspends, without an event loop '''
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("the coroutine suspended unexpectedly") #pragma: no cover
+
+def _await_loop(fn: Callable[[int, int], Awaitable[int]]) -> Callable[[], None]:
+    async def loop() -> None:
+        for i in range(N):
+            await fn(i, 1)
+    return lambda: drive(loop())
+
+def _call_loop(fn: Callable[[int, int], Any]) -> Callable[[], None]:
+    def loop() -> None:
+        for i in range(N):
+            fn(i, 1)
+    return loop
+
+def _wait_loop(fn: Callable[[int, int], Any]) -> Callable[[], None]:
+    def loop() -> None:
+        for i in range(N):
+            fn(i, 1).wait()
+    return loop
+
+
+# name -> setup, which returns (the function to measure, the number of operations it runs)
+BENCHMARKS : dict[str, Callable[[], tuple[Callable[[], None], int]]] = {
+    "call/await_raw": lambda: (_await_loop(async_add), N),
+    "call/await_wrapped": lambda: (_await_loop(wrapped_add), N),
+    "call/plain_sync": lambda: (_call_loop(sync_add), N),
+    "call/wait_wrapped": lambda: (_wait_loop(wrapped_add), N),
+}
+
+
+def measure(loop: Callable[[], None], ops: int = N) -> float:
+    ''' nanoseconds per operation, best of REPEAT '''
+    return min(timeit.repeat(loop, number=1, repeat=REPEAT)) / ops * 1e9
+
+
+def main() -> None:
+    ns = {name: measure(*setup()) for name, setup in BENCHMARKS.items()}
+    cases = [
+        ("await path", ns["call/await_raw"], ns["call/await_wrapped"]),
+        ("wait path", ns["call/plain_sync"], ns["call/wait_wrapped"]),
+    ]
+    print(f"{'case':<12}{'raw (ns)':>12}{'wrapped (ns)':>15}{'overhead (ns)':>16}")
+    for name, raw, wrapped in cases:
+        print(f"{name:<12}{raw:>12.1f}{wrapped:>15.1f}{wrapped - raw:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
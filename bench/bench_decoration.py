@@ -0,0 +1,87 @@
+'''
+Benchmark of the decoration time, i.e. the cost of `transform_function_to_sync` at import time
+
+The in-memory memo and the on-disk code cache are bypassed, so the full AST pipeline is measured.
+'''
+
+import linecache
+from collections.abc import Callable
+from typing import Any
+import easy_sync.transform
+import easy_sync.code_cache
+from types import ModuleType
+from easy_sync import configure_code_cache, transform_module
+from easy_sync.transform import transform_function_to_sync
+
+N = 100
+
+_FUNCTION_TEMPLATE = '''
+async def async_func_{i}(a: int, b: int) -> int:
+    await asyncio.sleep(0)
+    r = await async_func_{j}(a, b) if a > 0 else b
+    return sum([await async_func_{j}(x, b) for x in range(a)]) + r
+'''
+
+_DECORATED_TEMPLATE = '''
+@sync_compatible
+''' + _FUNCTION_TEMPLATE
+
+
+def _make_module(template: str, n: int, tag: str, header: str = "") -> tuple[str, dict[str, Any]]:
+    source = "import asyncio\nfrom easy_sync import sync_compatible\n" + header + "".join(template.format(i=i, j=max(i - 1, 0)) for i in range(n))
+    filename = f"<easy_sync-bench-{tag}-{n}>"
+    # make the source visible to `inspect.getsource`
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    return filename, {"__name__": "easy_sync_bench_module", "__file__": filename, "source": source}
+
+
+def _cold_start(run: Callable[[], None]) -> None:
+    ''' run without the in-memory memo and the on-disk code cache '''
+    enabled = easy_sync.code_cache._enabled
+    configure_code_cache(enabled=False)
+    easy_sync.transform._sync_code_memo.clear()
+    easy_sync.transform._substitutions_memo.clear()
+    easy_sync.transform._global_names_memo.clear()
+    try:
+        run()
+    finally:
+        configure_code_cache(enabled=enabled)
+
+
+def bench_transform(n: int = N) -> tuple[Callable[[], None], int]:
+    ''' transform n already defined async functions '''
+    filename, namespace = _make_module(_FUNCTION_TEMPLATE, n, "functions")
+    exec(compile(namespace["source"], filename, "exec"), namespace)
+    functions = [namespace[f"async_func_{i}"] for i in range(n)]
+
+    def transform_all() -> None:
+        for fn in functions:
+            transform_function_to_sync(fn)
+    return lambda: _cold_start(transform_all), n
+
+
+def bench_decorate_module(n: int = N) -> tuple[Callable[[], None], int]:
+    ''' execute a module with n `@sync_compatible` functions, i.e. the import time '''
+    filename, namespace = _make_module(_DECORATED_TEMPLATE, n, "decorated")
+    code = compile(namespace["source"], filename, "exec")
+    return lambda: _cold_start(lambda: exec(code, dict(namespace))), n
+
+
+def bench_batch_module(n: int = N) -> tuple[Callable[[], None], int]:
+    ''' execute a module with n `@sync_compatible` functions in the batch mode, then transform them in one pass '''
+    filename, namespace = _make_module(_DECORATED_TEMPLATE, n, "batch", header="__easy_sync_batch__ = True\n")
+    code = compile(namespace["source"], filename, "exec")
+
+    def run() -> None:
+        module = ModuleType(namespace["__name__"])
+        module.__dict__.update(namespace)
+        exec(code, module.__dict__)
+        transform_module(module)
+    return lambda: _cold_start(run), n
+
+
+BENCHMARKS : dict[str, Callable[[], tuple[Callable[[], None], int]]] = {
+    "decoration/transform_function": bench_transform,
+    "decoration/decorate_module": bench_decorate_module,
+    "decoration/batch_module": bench_batch_module,
+}
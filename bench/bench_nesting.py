@@ -0,0 +1,68 @@
+'''
+Benchmark of deeply nested call chains and awaits inside list comprehensions, in both sync and async paths
+'''
+
+from collections.abc import Callable
+from typing import Any
+from easy_sync import sync_compatible
+from bench_call_overhead import drive
+
+DEPTH = 20
+WIDTH = 100
+N = 2_000
+
+
+@sync_compatible
+async def async_leaf(x: int) -> int:
+    return x
+
+def _make_chain(depth: int) -> Any:
+    fn = async_leaf
+    for _ in range(depth):
+        fn = _make_link(fn)
+    return fn
+
+def _make_link(inner: Any) -> Any:
+    @sync_compatible
+    async def async_link(x: int) -> int:
+        return await inner(x) + 1
+    return async_link
+
+@sync_compatible
+async def async_list_comprehension(n: int) -> int:
+    return sum([await async_leaf(i) for i in range(n)])
+
+
+def bench_chain_wait() -> tuple[Callable[[], None], int]:
+    chain = _make_chain(DEPTH)
+    def run() -> None:
+        for i in range(N):
+            chain(i).wait()
+    return run, N * DEPTH
+
+def bench_chain_await() -> tuple[Callable[[], None], int]:
+    chain = _make_chain(DEPTH)
+    async def loop() -> None:
+        for i in range(N):
+            await chain(i)
+    return lambda: drive(loop()), N * DEPTH
+
+def bench_list_comprehension_wait() -> tuple[Callable[[], None], int]:
+    def run() -> None:
+        for _ in range(N // 10):
+            async_list_comprehension(WIDTH).wait()
+    return run, N // 10 * WIDTH
+
+def bench_list_comprehension_await() -> tuple[Callable[[], None], int]:
+    async def loop() -> None:
+        for _ in range(N // 10):
+            await async_list_comprehension(WIDTH)
+    return lambda: drive(loop()), N // 10 * WIDTH
+
+
+BENCHMARKS : dict[str, Callable[[], tuple[Callable[[], None], int]]] = {
+    "nesting/chain_wait": bench_chain_wait,
+    "nesting/chain_await": bench_chain_await,
+    "nesting/list_comprehension_wait": bench_list_comprehension_wait,
+    "nesting/list_comprehension_await": bench_list_comprehension_await,
+}
@@ -0,0 +1,54 @@
+'''
+Benchmark of the throughput of `f(x).wait()` called from many threads at the same time
+
+The result is the wall time per call of all the threads together, so with no shared state on the call path it goes
+down nearly linearly with the number of threads on a free-threaded build (python 3.13t and later, with the GIL
+disabled), while it stays flat (or goes up a bit) on a build with the GIL.
+'''
+
+import sys
+import threading
+from collections.abc import Callable
+from easy_sync import sync_compatible
+
+N = 20_000
+
+
+@sync_compatible
+async def async_leaf(x: int) -> int:
+    return x + 1
+
+@sync_compatible
+async def async_work(x: int) -> int:
+    return await async_leaf(x) + await async_leaf(x + 1)
+
+
+def gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None) # python 3.13+
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def _bench(threads: int) -> Callable[[], tuple[Callable[[], None], int]]:
+    def setup() -> tuple[Callable[[], None], int]:
+        def worker(barrier: threading.Barrier) -> None:
+            barrier.wait()
+            for i in range(N):
+                async_work(i).wait()
+
+        def run() -> None:
+            barrier = threading.Barrier(threads)
+            workers = [threading.Thread(target=worker, args=(barrier,)) for _ in range(threads)]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+        return run, N * threads
+    return setup
+
+
+# the names tell whether the GIL is enabled, since the numbers are not comparable between the two kinds of builds
+_BUILD = "gil" if gil_enabled() else "nogil"
+
+BENCHMARKS : dict[str, Callable[[], tuple[Callable[[], None], int]]] = {
+    f"threads/{_BUILD}/wait_{threads}_threads": _bench(threads) for threads in (1, 2, 4, 8)
+}
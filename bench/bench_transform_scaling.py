@@ -0,0 +1,83 @@
+'''
+Benchmark of the transformation time of big generated functions, the cost is reported per statement
+
+The transformer is expected to be linear in the size of the function, so the ns/statement of the small and the big
+variants (and of the flat and the deeply nested ones) should stay close. The exception is the nesting of async
+functions: the sync version of a function keeps the async version of each nested function too (with its original
+body, including the functions nested deeper), so the generated code grows with the statements times that depth.
+'''
+
+import linecache
+from collections.abc import Callable
+from typing import Any
+from bench_decoration import _cold_start
+from easy_sync.transform import transform_function_to_sync
+
+_STATEMENTS = (
+    "x = await async_leaf(x)",
+    "await asyncio.sleep(0)",
+    "y = [await async_leaf(i) for i in range(x % 3)]",
+    "x = x + len(y)",
+)
+
+_HEADER = '''import asyncio
+
+async def async_leaf(x: int) -> int:
+    return x
+
+'''
+
+
+def _make_function(depth: int, statements_per_level: int, nested_functions: bool) -> str:
+    '''
+    an async function with `depth` levels of nesting, every level has the statements and then the next level, which
+    is either a nested async function (called right after its definition) or a block (`for` / `if` / `try`)
+    '''
+
+    lines = ["async def async_level_0(x: int) -> int:"]
+    for level in range(depth):
+        indent = "    " * (level + 1)
+        lines.extend(indent + _STATEMENTS[i % len(_STATEMENTS)] for i in range(statements_per_level))
+        if level + 1 == depth:
+            lines.append(f"{indent}return x")
+        elif nested_functions:
+            lines.append(f"{indent}async def async_level_{level + 1}(x: int) -> int:")
+        else:
+            lines.append(indent + ("for _ in range(1):", "if x >= 0:", "try:")[level % 3])
+    if nested_functions:
+        for level in reversed(range(depth - 1)):
+            indent = "    " * (level + 1)
+            lines.append(f"{indent}return await async_level_{level + 1}(x)")
+    else:
+        for level in reversed(range(depth - 1)):
+            if level % 3 == 2:
+                lines.append("    " * (level + 1) + "finally:")
+                lines.append("    " * (level + 2) + "pass")
+        lines.append("    return x")
+    return "\n".join(lines) + "\n"
+
+
+def _bench(depth: int, statements_per_level: int, nested_functions: bool = False) -> Callable[[], tuple[Callable[[], None], int]]:
+    def setup() -> tuple[Callable[[], None], int]:
+        source = _HEADER + _make_function(depth, statements_per_level, nested_functions)
+        filename = f"<easy_sync-bench-scaling-{depth}x{statements_per_level}-{nested_functions}>"
+        # make the source visible to `inspect.getsource`
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        namespace : dict[str, Any] = {"__name__": "easy_sync_bench_module", "__file__": filename}
+        exec(compile(source, filename, "exec"), namespace)
+        fn = namespace["async_level_0"]
+
+        def transform() -> None:
+            transform_function_to_sync(fn)
+        return lambda: _cold_start(transform), depth * statements_per_level
+    return setup
+
+
+BENCHMARKS : dict[str, Callable[[], tuple[Callable[[], None], int]]] = {
+    "transform_scaling/flat_500": _bench(1, 500),
+    "transform_scaling/flat_4000": _bench(1, 4000),
+    "transform_scaling/blocks_4x125": _bench(4, 125),
+    "transform_scaling/blocks_18x220": _bench(18, 220), # python allows 20 levels of nested blocks at most
+    "transform_scaling/functions_4x125": _bench(4, 125, nested_functions=True),
+    "transform_scaling/functions_40x100": _bench(40, 100, nested_functions=True),
+}
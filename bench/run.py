@@ -0,0 +1,108 @@
+'''
+Standalone runner of the benchmark suite under `bench/`
+
+Each `bench/bench_*.py` module exposes `BENCHMARKS`, a dict of name -> setup, where the setup returns
+(the function to measure, the number of operations it runs). The runner reports nanoseconds per operation.
+
+To make the results comparable across machines, every result is also normalized by the cost of a plain
+Python function call measured in the same run, and the normalized values are compared with the baseline:
+
+    ```
+    python bench/run.py                     # run and compare with bench/baseline.json
+    python bench/run.py --save              # run and overwrite the baseline
+    python bench/run.py -k nesting          # only the benchmarks whose name contains "nesting"
+    python bench/run.py --threshold 0.5     # fail if any benchmark is more than 50% slower than the baseline
+    ```
+
+The exit code is 1 when any benchmark regresses beyond the threshold.
+'''
+
+import sys
+import json
+import timeit
+import argparse
+import importlib
+from pathlib import Path
+from collections.abc import Callable
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+REPEAT = 5
+
+Setup = Callable[[], tuple[Callable[[], None], int]]
+
+
+def _plain_function(a: int, b: int) -> int:
+    return a + b
+
+def _calibration() -> tuple[Callable[[], None], int]:
+    n = 200_000
+    def run() -> None:
+        for i in range(n):
+            _plain_function(i, 1)
+    return run, n
+
+
+def collect(keyword: str = "") -> dict[str, Setup]:
+    sys.path.insert(0, str(BENCH_DIR))
+    benchmarks : dict[str, Setup] = {}
+    for path in sorted(BENCH_DIR.glob("bench_*.py")):
+        module = importlib.import_module(path.stem)
+        for name, setup in getattr(module, "BENCHMARKS", {}).items():
+            if keyword in name:
+                benchmarks[name] = setup
+    return benchmarks
+
+
+def measure(setup: Setup, repeat: int = REPEAT) -> float:
+    ''' nanoseconds per operation, best of `repeat` '''
+    run, ops = setup()
+    run() # warm up, e.g. the lazy transformation
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / ops * 1e9
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    ''' returns the names of the benchmarks which regress more than the threshold '''
+    return [name for name, value in results.items() if name in baseline and value > baseline[name] * (1 + threshold)]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--keyword", default="", help="only run the benchmarks whose name contains this")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="the JSON baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown relative to the baseline (default: 0.25)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    calibration = measure(_calibration, args.repeat)
+    ns = {name: measure(setup, args.repeat) for name, setup in collect(args.keyword).items()}
+    normalized = {name: value / calibration for name, value in ns.items()}
+
+    baseline : dict[str, float] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())["normalized"]
+
+    print(f"calibration (plain function call): {calibration:.1f} ns")
+    print(f"{'benchmark':<40}{'ns/op':>12}{'normalized':>12}{'baseline':>12}{'change':>10}")
+    for name, value in ns.items():
+        base = baseline.get(name)
+        change = f"{normalized[name] / base - 1:+.0%}" if base else "-"
+        base_str = f"{base:.2f}" if base else "-"
+        print(f"{name:<40}{value:>12.1f}{normalized[name]:>12.2f}{base_str:>12}{change:>10}")
+
+    if args.save:
+        saved = {**baseline, **normalized}
+        args.baseline.write_text(json.dumps({"calibration_ns": calibration, "normalized": dict(sorted(saved.items()))}, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(normalized, baseline, args.threshold)
+    for name in regressions:
+        print(f"REGRESSION: {name} is {normalized[name] / baseline[name] - 1:+.0%} compared with the baseline (threshold {args.threshold:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
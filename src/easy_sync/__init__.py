@@ -1,40 +1,65 @@
 import asyncio
-from functools import wraps
-from collections.abc import Awaitable, Callable
-from typing import TypeAlias, TypeVar, ParamSpec, overload
-from easy_sync.transform import transform_function_to_sync
+import importlib
+import inspect
+import sys
+import pkgutil
+import threading
+import contextvars
+from concurrent.futures import Executor
+from functools import partial, wraps
+from types import MethodType, ModuleType
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, Literal, TypeVar, ParamSpec, overload
+from easy_sync.waitable import Thunk, Waitable, SharedWaitable, StartedWaitable, WaitableGenerator
+from easy_sync.transform import transform_function_to_sync, transform_class_to_sync, prepare_module, explain
+from easy_sync.background_loop import run_coroutine
+from easy_sync.code_cache import configure_code_cache
+from easy_sync.substitutions import register_substitution, unregister_substitution
+from easy_sync.instrumentation import CallHook, MetricsCollector, add_hook, remove_hook
+from easy_sync.result_cache import ResultCache
+from easy_sync.decorators import dual_decorator, concurrency_limit, rate_limit
+from easy_sync import runtime
+from easy_sync.runtime import run_many
 
 
 P = ParamSpec("P")
 R = TypeVar("R")
+Y = TypeVar("Y")
+T = TypeVar("T")
 
-Thunk : TypeAlias = Callable[[], R]
+# False in the async functions, folded into True by the transformer in the generated sync versions, so that
+# `if easy_sync.IS_SYNC: ... else: ...` keeps only the branch of each version, with no check at runtime
+IS_SYNC = False
 
-class Waitable(Awaitable[R]):
-    ''' A class to represent the result of an async operation '''
 
-    def __init__(self, async_thunk: Thunk[Awaitable[R]], sync_thunk : Thunk[R]):
-        self._async_thunk = async_thunk
-        self._sync_thunk = sync_thunk
-
-    def __await__(self):
-        return self._async_thunk().__await__()
+@overload
+def sync_compatible(fn: type[T], /) -> type[T]:
+    ... # pragma: no cover
 
-    def wait(self) -> R:
-        ''' sync wait for the result '''
-        return self._sync_thunk()
+@overload
+def sync_compatible(fn: Callable[P, AsyncIterator[Y]], /) -> Callable[P, WaitableGenerator[Y]]:
+    ... # pragma: no cover
 
+@overload
+def sync_compatible(fn: Callable[P, Awaitable[R]], /) -> Callable[P, Waitable[R]]:
+    ... # pragma: no cover
 
 @overload
-def sync_compatible(fn: Callable[P, Awaitable[R]]) -> Callable[P, Waitable[R]]:
+def sync_compatible(*, sync_fn: Callable[P, R], cache: ResultCache | bool | None = None, eager: bool = False) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
     ... # pragma: no cover
 
 @overload
-def sync_compatible(*, sync_fn: Callable[P, R]) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
+def sync_compatible(*, lazy: bool = False, background_loop: bool = False, cache: ResultCache | bool | None = None, eager: bool = False) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
     ... # pragma: no cover
 
 def sync_compatible( #type: ignore
-        sync_fn: Callable[P, Awaitable[R]] | Callable[P, R]) -> Callable[P, Waitable[R]] | Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
+        fn: Callable[P, Awaitable[R]] | Callable[P, R] | None = None, /, *,
+        sync_fn: Callable[P, R] | None = None,
+        lazy: bool = False,
+        background_loop: bool = False,
+        cache: ResultCache | bool | None = None,
+        eager: bool = False,
+    ) -> Callable[P, Waitable[R]] | Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
 
     '''
     A decorator to make an async function sync compatible
@@ -73,38 +98,433 @@ def sync_compatible( #type: ignore
 
         main()
         ```
+
+
+    Usage 3 (generate sync version lazily, on the first `.wait()`):
+
+        ```
+        @sync_compatible(lazy=True)
+        async def async_add(a: int, b: int) -> int:
+            await asyncio.sleep(1)
+            return a + b
+        ```
+
+        This saves the import time and memory for processes which only use the async version,
+        call `warmup(module)` to transform everything ahead of time.
+
+
+    Usage 4 (no transformation, `.wait()` runs the coroutine on a shared background event loop):
+
+        ```
+        @sync_compatible(background_loop=True)
+        async def fetch(url: str) -> bytes:
+            async with session.get(url) as response:
+                return await response.read()
+        ```
+
+        This is useful for the functions which cannot be transformed, the loop lives on a dedicated thread
+        and is reused by all calls, so the resources bound to it (e.g. connection pools) are reused too.
+
+
+    Usage 5 (async generators, iterate via `async for` or plain `for`):
+
+        ```
+        @sync_compatible
+        async def async_pages(n: int):
+            for i in range(n):
+                await asyncio.sleep(1)
+                yield i
+
+        def main():
+            for page in async_pages(3):
+                print(page)
+        ```
+
+
+    Usage 6 (decorate a class, all its async methods become sync compatible):
+
+        ```
+        @sync_compatible
+        class Client:
+            async def fetch(self, url: str) -> bytes:
+                ...
+
+            @classmethod
+            async def connect(cls, host: str) -> 'Client':
+                ...
+        ```
+
+        The class source is parsed and compiled once for all the methods, see `sync_compatible_class`.
+
+
+    Usage 7 (cache the results, shared by `.wait()` and `await`):
+
+        ```
+        @sync_compatible(cache=ResultCache(maxsize=1024, ttl=60))
+        async def get_user(user_id: int) -> User:
+            ...
+        ```
+
+        Concurrent calls with the same arguments are collapsed into one execution, `cache=True` uses `ResultCache()`.
+
+
+    Usage 8 (start running on call, like `asyncio.create_task`, see `Waitable.start()`):
+
+        ```
+        @sync_compatible(eager=True)
+        async def fetch(url: str) -> bytes:
+            ...
+
+        async def main():
+            a, b = fetch(url_a), fetch(url_b) # both are running now
+            return await a + await b
+        ```
     '''
 
-    if asyncio.iscoroutinefunction(sync_fn):
-        # 装饰器的无参数用法，这里的 sync_fn 直接是被装饰的 async 函数而不是 sync_fn 参数
-        fn = sync_fn # the function is async actually
-        return sync_compatible_auto(fn)
-    else:
-        return sync_compatible_manual(sync_fn) #type: ignore
+    if fn is not None and inspect.isclass(fn):
+        if (cache is not None and cache is not False) or eager:
+            raise TypeError("[sync_compatible()]: cache and eager are not supported for classes, decorate the methods instead")
+        return sync_compatible_class(fn, lazy=lazy, background_loop=background_loop) #type: ignore
+
+    if fn is not None and (asyncio.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn)):
+        # 装饰器的无参数用法，这里的 fn 直接是被装饰的 async 函数
+        return sync_compatible_auto(fn, lazy=lazy, background_loop=background_loop, cache=cache, eager=eager) #type: ignore # narrowed to coroutine or async generator functions
+
+    if fn is not None:
+        sync_fn = fn #type: ignore # the sync function passed positionally
+    if sync_fn is not None:
+        return sync_compatible_manual(sync_fn, cache=cache, eager=eager) #type: ignore
+    return lambda fn: sync_compatible(fn, lazy=lazy, background_loop=background_loop, cache=cache, eager=eager) #type: ignore
+
 
+def sync_compatible_auto(fn: Callable[P, Awaitable[R]], lazy: bool = False, background_loop: bool = False, cache: ResultCache | bool | None = None, eager: bool = False) -> Callable[P, Waitable[R]]:
+    return _with_options(_auto_wrapper(fn, lazy=lazy, background_loop=background_loop), fn, cache, eager)
 
-def sync_compatible_auto(fn: Callable[P, Awaitable[R]]) -> Callable[P, Waitable[R]]:
+
+def _auto_wrapper(fn: Callable[P, Awaitable[R]], lazy: bool, background_loop: bool) -> Callable[P, Waitable[R]]:
+    if background_loop:
+        return _wrapper_maker_maker(_background_loop_sync_fn(fn))(fn)
+    if lazy:
+        return _lazy_wrapper_maker(fn)
+    if getattr(fn, '__globals__', {}).get('__easy_sync_batch__'):
+        # the module opted in the batch mode, the whole module is transformed in one pass on first use
+        return _lazy_wrapper_maker(fn, batch=True)
     real_sync_fn = transform_function_to_sync(fn)
     return _wrapper_maker_maker(real_sync_fn)(fn)
 
 
-def sync_compatible_manual(sync_fn: Callable[P, R]) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
+def _background_loop_sync_fn(fn: Callable[P, Awaitable[R]]) -> Callable[P, R]:
+    if not asyncio.iscoroutinefunction(fn):
+        raise TypeError("[sync_compatible()]: background_loop=True only supports coroutine functions")
+
+    def sync_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        return run_coroutine(fn(*args, **kwargs)) #type: ignore
+    return sync_fn
+
+
+def _lazy_wrapper_maker(fn: Callable[P, Awaitable[R]], batch: bool = False) -> Callable[P, Waitable[R]]:
+    lock = threading.Lock()
+    real_sync_fn : Callable[P, R] | None = None
+
+    def resolve_sync_fn() -> Callable[P, R]:
+        nonlocal real_sync_fn
+        if real_sync_fn is None:
+            module = sys.modules.get(fn.__module__)
+            if batch and module is not None:
+                prepare_module(module) #NOTE: outside the lock, it only fills the memo and resolves no wrapper
+            with lock: # double-checked, so that the transformation happens only once even if multiple threads race
+                if real_sync_fn is None:
+                    real_sync_fn = transform_function_to_sync(fn)
+                    wrapper.__sync__ = real_sync_fn #type: ignore # later direct calls skip the lazy trampoline
+        return real_sync_fn
+
+    def lazy_sync_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        return resolve_sync_fn()(*args, **kwargs)
+
+    wrapper = _wrapper_maker_maker(lazy_sync_fn)(fn)
+    wrapper._resolve_sync_fn = resolve_sync_fn #type: ignore
+    return wrapper
+
+
+def sync_compatible_manual(sync_fn: Callable[P, R], cache: ResultCache | bool | None = None, eager: bool = False) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
+    if (cache is not None and cache is not False) or eager:
+        return lambda fn: _with_options(_wrapper_maker_maker(sync_fn)(fn), fn, cache, eager)
     return _wrapper_maker_maker(sync_fn)
 
 
+def _with_options(wrapper: Callable[P, Waitable[R]], fn: Callable[P, Awaitable[R]], cache: ResultCache | bool | None, eager: bool) -> Callable[P, Waitable[R]]:
+    if cache is not None and cache is not False:
+        wrapper = _with_cache(wrapper, fn, cache)
+    if eager:
+        wrapper = _with_eager_start(wrapper, fn)
+    return wrapper
+
+
+def _with_eager_start(wrapper: Callable[P, Waitable[R]], fn: Callable[P, Awaitable[R]]) -> Callable[P, Waitable[R]]:
+    if inspect.isasyncgenfunction(fn):
+        raise TypeError("[sync_compatible()]: eager is not supported for async generators")
+
+    @wraps(wrapper) # also copies `__sync__`, the generated sync code calls it directly, which needs no eager start
+    def eager_wrapper(*args: P.args, **kwargs: P.kwargs) -> Waitable[R]:
+        return wrapper(*args, **kwargs).start()
+    return eager_wrapper
+
+
+def _with_cache(wrapper: Callable[P, Waitable[R]], fn: Callable[P, Awaitable[R]], cache: ResultCache | bool) -> Callable[P, Waitable[R]]:
+    ''' wrap both versions of a sync compatible function with the same result cache '''
+
+    if inspect.isasyncgenfunction(fn):
+        raise TypeError("[sync_compatible()]: cache is not supported for async generators")
+    result_cache = ResultCache() if cache is True else cache
+    assert isinstance(result_cache, ResultCache)
+
+    @wraps(fn)
+    async def cached_async_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await result_cache.get_async(ResultCache.make_key(fn, args, kwargs), lambda: fn(*args, **kwargs))
+
+    def cached_sync_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        #NOTE: `__sync__` is looked up on each call, since a lazy wrapper replaces it once resolved
+        return result_cache.get_sync(ResultCache.make_key(fn, args, kwargs), lambda: wrapper.__sync__(*args, **kwargs)) #type: ignore
+
+    cached_wrapper = _wrapper_maker_maker(cached_sync_fn)(cached_async_fn)
+    cached_wrapper._resolve_sync_fn = wrapper._resolve_sync_fn #type: ignore
+    return cached_wrapper
+
+
 def _wrapper_maker_maker(sync_fn: Callable[P, R]) -> Callable[ [Callable[P, Awaitable[R]]], Callable[P, Waitable[R]]]:
     def wrapper_maker(fn: Callable[P, Awaitable[R]]) -> Callable[P, Waitable[R]]:
 
-        @wraps(fn)
-        def wrapper(*args: P.args, **kwargs: P.kwargs) -> Waitable[R]:
+        if inspect.isasyncgenfunction(fn):
+            @wraps(fn)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> WaitableGenerator[Any]: #type: ignore
+                return WaitableGenerator(fn, sync_fn, args, kwargs) #type: ignore
+        else:
+            @wraps(fn)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> Waitable[R]:
+                return Waitable(fn, sync_fn, args, kwargs)
+
+        wrapper.__sync__ = sync_fn #type: ignore # the generated sync code calls `f.__sync__(x)` directly
+        wrapper._resolve_sync_fn = lambda: sync_fn #type: ignore
+        return wrapper #type: ignore # the async generator version returns a WaitableGenerator
+    return wrapper_maker
 
-            def sync_thunk() -> R:
-                return sync_fn(*args, **kwargs) #type: ignore
 
-            def async_thunk() -> Awaitable[R]:
-                return fn(*args, **kwargs)
+@overload
+def async_compatible(fn: Callable[P, R], /) -> Callable[P, Waitable[R]]:
+    ... # pragma: no cover
 
-            return Waitable(async_thunk=async_thunk, sync_thunk=sync_thunk)
+@overload
+def async_compatible(*, executor: Executor | Literal['thread', 'process'] = 'thread') -> Callable[ [Callable[P, R]], Callable[P, Waitable[R]]]:
+    ... # pragma: no cover
 
-        return wrapper
-    return wrapper_maker
+def async_compatible( #type: ignore
+        fn: Callable[P, R] | None = None, /, *,
+        executor: Executor | Literal['thread', 'process'] = 'thread',
+    ) -> Callable[P, Waitable[R]] | Callable[ [Callable[P, R]], Callable[P, Waitable[R]]]:
+
+    '''
+    A decorator to make a sync function async compatible, the reverse of `@sync_compatible`
+
+    `.wait()` calls the function directly, while `await` runs it on an executor, so that a CPU-heavy or blocking
+    function doesn't stall the event loop:
+
+        ```
+        @async_compatible
+        def parse(data: bytes) -> Document:
+            ...
+
+        @async_compatible(executor="process")
+        def render(doc: Document) -> bytes:
+            ...
+
+        async def handler(data: bytes) -> bytes:
+            return await render(await parse(data))
+        ```
+
+    The executor is "thread" (the one of `easy_sync.runtime.set_executor`), "process" (the one of
+    `easy_sync.runtime.set_process_executor`), or an `Executor` instance. In the thread mode, the function runs
+    in a copy of the current context, like `asyncio.to_thread`. In the process mode, the function must be defined
+    at the top level of a module, and the arguments and the result must be picklable.
+
+    The generated sync code of `@sync_compatible` functions calls it directly too, via `f.__sync__`.
+    '''
+
+    if fn is None:
+        return lambda fn: async_compatible(fn, executor=executor) #type: ignore
+    if asyncio.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn):
+        raise TypeError(f"[async_compatible()]: {fn.__qualname__} is already async, use @sync_compatible instead")
+
+    if executor == 'process':
+        if '<locals>' in fn.__qualname__ or (fn.__module__ == '__main__' and not hasattr(sys.modules['__main__'], '__file__')):
+            raise TypeError(f"[async_compatible()]: {fn.__qualname__} must be defined at the top level of a module to run in another process")
+        async_fn = _process_async_fn(fn)
+    elif executor == 'thread' or isinstance(executor, Executor):
+        async_fn = _thread_async_fn(fn, None if executor == 'thread' else executor) #type: ignore
+    else:
+        raise ValueError(f"[async_compatible()]: executor must be 'thread', 'process' or an Executor, got {executor!r}")
+
+    @wraps(fn)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> Waitable[R]:
+        return Waitable(async_fn, fn, args, kwargs)
+
+    wrapper.__sync__ = fn #type: ignore # the generated sync code calls `f.__sync__(x)` directly
+    return wrapper
+
+
+def _thread_async_fn(fn: Callable[P, R], executor: Executor | None) -> Callable[P, Awaitable[R]]:
+    @wraps(fn)
+    async def async_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        #NOTE: run as a worker, so that the sync gather / create_task of fn run inline instead of waiting for the same pool
+        return await loop.run_in_executor(executor or runtime.get_executor(), partial(context.run, runtime._run_in_worker, fn, *args, **kwargs))
+    return async_fn
+
+
+def _process_async_fn(fn: Callable[P, R]) -> Callable[P, Awaitable[R]]:
+    @wraps(fn)
+    async def async_fn(*args: P.args, **kwargs: P.kwargs) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(runtime.get_process_executor(), partial(_call_in_process, fn.__module__, fn.__qualname__, args, kwargs))
+    return async_fn
+
+
+def _call_in_process(module_name: str, qualname: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+    '''
+    runs in the worker process, the function is sent by name, since pickling it fails: the module attribute of that
+    name is the wrapper, not the function itself
+    '''
+
+    obj : Any = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    return getattr(obj, '__sync__', obj)(*args, **kwargs)
+
+
+class SyncCompatibleMethod:
+    '''
+    The descriptor of a sync compatible method, which caches the bound method in the instance `__dict__` on first access
+    (like `functools.cached_property`), so that later accesses are plain attribute lookups
+
+    NOTE: since the cached bound method refers to the instance, a shallow copy (`copy.copy()`) of an instance which has
+    accessed the method would share it, delete the cached entries from the copy's `__dict__` if this matters.
+    '''
+
+    __slots__ = ('__wrapped__', '_name')
+
+    def __init__(self, wrapper: Callable[..., Any], name: str):
+        self.__wrapped__ = wrapper
+        self._name = name
+
+    def __get__(self, instance: Any, owner: type | None = None) -> Any:
+        if instance is None:
+            return self.__wrapped__
+        bound = MethodType(self.__wrapped__, instance)
+        if self._is_resolved_by(type(instance)): # but not when accessed via `super()`, or the override would be shadowed
+            try:
+                instance.__dict__[self._name] = bound
+            except AttributeError: # instances without `__dict__`, e.g. classes with `__slots__`
+                pass
+        return bound
+
+    def _is_resolved_by(self, cls: type) -> bool:
+        for klass in cls.__mro__:
+            if self._name in klass.__dict__:
+                return klass.__dict__[self._name] is self
+        return False #pragma: no cover
+
+    def __getattr__(self, name: str) -> Any:
+        # `__sync__`, `_resolve_sync_fn` and alike
+        return getattr(self.__wrapped__, name)
+
+
+def _is_async_method(fn: Any, cls: type, name: str) -> bool:
+    '''
+    plain async methods defined in the class body, and the ones decorated by dual-mode decorators (see
+    `easy_sync.decorators`), other decorated ones are left untouched
+    '''
+    if not (inspect.isfunction(fn) and (asyncio.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn)) and not hasattr(fn, '__sync__')):
+        return False
+    if hasattr(fn, '__wrapped__'):
+        if not hasattr(fn, '__sync_decorator__'):
+            return False
+        fn = inspect.unwrap(fn)
+    return fn.__qualname__ == f"{cls.__qualname__}.{name}"
+
+
+def sync_compatible_class(cls: type[T], lazy: bool = False, background_loop: bool = False) -> type[T]:
+    '''
+    Make all the async methods of a class sync compatible, including classmethods and staticmethods
+
+    The class source is parsed once and all the sync methods are compiled into a single code object, which is much
+    cheaper than decorating the methods one by one. With `lazy=True` or `background_loop=True`, the methods are
+    handled one by one as `@sync_compatible(lazy=True)` or `@sync_compatible(background_loop=True)` do.
+
+    The class type is returned unchanged, so type checkers still see the methods as async ones returning coroutines,
+    the typing of `.wait()` needs the methods to be decorated one by one.
+    '''
+
+    methods : dict[str, Callable[..., Any]] = {}
+    for name, value in list(vars(cls).items()):
+        fn = value.__func__ if isinstance(value, (classmethod, staticmethod)) else value
+        if _is_async_method(fn, cls, name):
+            methods[name] = fn
+
+    if lazy or background_loop:
+        wrappers = {name: sync_compatible_auto(fn, lazy=lazy, background_loop=background_loop) for name, fn in methods.items()}
+    else:
+        sync_fns = transform_class_to_sync(cls, methods)
+        wrappers = {name: _wrapper_maker_maker(sync_fns[name])(fn) for name, fn in methods.items()}
+
+    for name, wrapper in wrappers.items():
+        value = vars(cls)[name]
+        if isinstance(value, classmethod):
+            setattr(cls, name, classmethod(wrapper))
+        elif isinstance(value, staticmethod):
+            setattr(cls, name, staticmethod(wrapper))
+        else:
+            setattr(cls, name, SyncCompatibleMethod(wrapper, name))
+    return cls
+
+
+def warmup(module: ModuleType | str, recursive: bool = False) -> int:
+    '''
+    Transform all the sync compatible functions defined in a module ahead of time,
+    useful for functions decorated with `@sync_compatible(lazy=True)`
+
+    If `recursive` is True and the module is a package, all its submodules are imported and warmed up too.
+    Returns the number of sync compatible functions found.
+    '''
+
+    if isinstance(module, str):
+        module = importlib.import_module(module)
+
+    modules = [module]
+    if recursive and hasattr(module, '__path__'):
+        for info in pkgutil.walk_packages(module.__path__, module.__name__ + '.'):
+            modules.append(importlib.import_module(info.name))
+
+    return sum(transform_module(mod) for mod in modules)
+
+
+def transform_module(module: ModuleType | str) -> int:
+    '''
+    Transform all the sync compatible functions defined in a module, reading and parsing the module source only once
+
+    Decorating functions one by one reads and scans the module source for each function, call this at the end of
+    a module with many `@sync_compatible(lazy=True)` functions, or opt in the batch mode for the whole module
+    by setting `__easy_sync_batch__ = True` before the decorated functions, then they are transformed together
+    on the first use. Returns the number of sync compatible functions found.
+    '''
+
+    if isinstance(module, str):
+        module = sys.modules.get(module) or importlib.import_module(module)
+
+    prepare_module(module)
+    count = 0
+    for obj in list(vars(module).values()):
+        resolve = getattr(obj, '_resolve_sync_fn', None)
+        if callable(resolve):
+            resolve()
+            count += 1
+    return count
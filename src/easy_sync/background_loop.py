@@ -0,0 +1,95 @@
+'''
+A long-lived event loop running on a dedicated daemon thread, shared per process
+
+It's the sync fallback for the functions which cannot be transformed: `run_coroutine(coro)` submits
+the coroutine to the background loop and blocks until it completes, so that no event loop is created
+per call, and the resources bound to the loop (e.g. connection pools) can be reused across calls.
+'''
+
+import os
+import asyncio
+import threading
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+from easy_sync import deadline
+
+R = TypeVar("R")
+
+_lock = threading.Lock()
+_loop : asyncio.AbstractEventLoop | None = None
+_thread : threading.Thread | None = None
+_pid : int | None = None
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    ''' get the background event loop, start it on first use (and again in a forked child process) '''
+
+    global _loop, _thread, _pid
+    loop = _loop
+    if loop is not None and _pid == os.getpid():
+        return loop
+
+    with _lock:
+        if _loop is None or _pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_run_forever, args=(loop,), name='easy_sync-background-loop', daemon=True)
+            thread.start()
+            _loop, _thread, _pid = loop, thread, os.getpid()
+        return _loop
+
+
+def _run_forever(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def run_coroutine(coro: Coroutine[Any, Any, R]) -> R:
+    '''
+    Run the coroutine on the background event loop and wait for the result
+
+    If called from the background loop thread itself (i.e. a coroutine running on it waits synchronously),
+    the coroutine runs on a temporary event loop in another thread instead, to avoid the deadlock.
+    The coroutine is cancelled when the deadline of the current sync call (see `easy_sync.deadline`) comes.
+    '''
+
+    remaining = deadline.remaining()
+    if remaining is not None:
+        coro = _with_timeout(coro, remaining)
+
+    loop = get_background_loop()
+    if threading.current_thread() is _thread:
+        return _run_in_new_thread(coro)
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def _with_timeout(coro: Coroutine[Any, Any, R], timeout: float) -> R:
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        #NOTE: `asyncio.TimeoutError` is an alias of the builtin one since python 3.11 only
+        raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed") from None
+
+
+def _run_in_new_thread(coro: Coroutine[Any, Any, R]) -> R:
+    result : list[Any] = []
+
+    def target() -> None:
+        try:
+            result.append((True, asyncio.run(coro)))
+        except BaseException as e:
+            result.append((False, e))
+
+    thread = threading.Thread(target=target, name='easy_sync-nested-loop')
+    thread.start()
+    thread.join()
+
+    ok, value = result[0]
+    if not ok:
+        raise value
+    return value
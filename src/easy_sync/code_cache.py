@@ -0,0 +1,129 @@
+'''
+On-disk cache of the generated sync code, similar to `__pycache__`.
+
+The cache stores the marshalled code object produced by `transform_function_to_sync`,
+so that warm imports can skip the `ast.parse` / `ast.unparse` / `compile` pipeline.
+
+Each cache entry is validated by a key derived from the function source, the source
+filename, the Python version and the easy_sync version, so that an entry is
+regenerated whenever any of them changes.
+
+Configuration:
+
+- environment variable `EASY_SYNC_CACHE=0` disables the cache
+- environment variable `EASY_SYNC_CACHE_DIR=<path>` puts all cache files into `<path>`
+- `configure_code_cache(enabled=..., directory=...)` does the same at runtime
+'''
+
+import os
+import sys
+import hashlib
+import marshal
+import threading
+from functools import lru_cache
+from typing import Any
+
+_MAGIC = b'ESYC'
+_FORMAT = '4' # bump this when the layout of the cached payload changes
+_KEY_SIZE = hashlib.sha256().digest_size
+
+_enabled : bool = os.environ.get('EASY_SYNC_CACHE', '1').lower() not in ('0', 'false', 'no', 'off')
+_directory : str | None = os.environ.get('EASY_SYNC_CACHE_DIR') or None
+
+
+def configure_code_cache(enabled: bool | None = None, directory: str | os.PathLike[str] | None = None) -> None:
+    '''
+    Configure the on-disk cache of generated sync code
+
+    - `enabled`: turn the cache on or off, `None` means keep unchanged
+    - `directory`: put all cache files into this directory instead of the `__pycache__/easy_sync` folder next to each source file
+    '''
+
+    global _enabled, _directory
+    if enabled is not None:
+        _enabled = enabled
+    if directory is not None:
+        _directory = os.fspath(directory)
+
+
+@lru_cache(maxsize=None)
+def _easy_sync_version() -> str:
+    ''' looked up on first use, since `importlib.metadata` scans the installed distributions, which slows the import down '''
+    try:
+        from importlib.metadata import version
+        return version('easy-sync')
+    except Exception: #pragma: no cover
+        return 'unknown'
+
+
+def _cache_key(source_code: str, filename: str, context: str) -> bytes:
+    h = hashlib.sha256()
+    for part in (_FORMAT, sys.version, _easy_sync_version(), filename, context, source_code):
+        h.update(part.encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    return h.digest()
+
+
+def _cache_path(filename: str, qualname: str) -> str | None:
+    if _directory is not None:
+        directory = _directory
+    elif os.path.isfile(filename):
+        directory = os.path.join(os.path.dirname(os.path.abspath(filename)), '__pycache__', 'easy_sync')
+    else:
+        return None # e.g. functions defined in `<stdin>` or inside a zipapp
+
+    entry_id = hashlib.sha1(f"{os.path.abspath(filename)}:{qualname}".encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(directory, f"{stem}.{entry_id}.{sys.implementation.cache_tag}.bin")
+
+
+def load(filename: str, qualname: str, source_code: str, context: str = '') -> Any | None:
+    '''
+    load the cached payload, return None if missing or outdated
+
+    `context` is anything else besides the source code which affects the generated code
+    '''
+
+    if not _enabled:
+        return None
+    path = _cache_path(filename, qualname)
+    if path is None:
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    header_size = len(_MAGIC) + _KEY_SIZE
+    if data[:len(_MAGIC)] != _MAGIC or data[len(_MAGIC):header_size] != _cache_key(source_code, filename, context):
+        return None
+
+    try:
+        return marshal.loads(data[header_size:])
+    except (EOFError, ValueError, TypeError): #pragma: no cover
+        return None
+
+
+def store(filename: str, qualname: str, source_code: str, payload: Any, context: str = '') -> None:
+    ''' store the payload, failures (e.g. read-only file system) are ignored silently '''
+
+    if not _enabled:
+        return
+    path = _cache_path(filename, qualname)
+    if path is None:
+        return
+
+    data = _MAGIC + _cache_key(source_code, filename, context) + marshal.dumps(payload)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # unique per writer, threads of a process included
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path) # atomic, concurrent writers won't produce a broken file
+    except OSError: #pragma: no cover
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,111 @@
+'''
+Generate the sync code of a package ahead of time
+
+    ```
+    python -m easy_sync.compile mypkg           # write mypkg/__easy_sync__.py
+    python -m easy_sync.compile mypkg --check   # exit with 1 if mypkg/__easy_sync__.py is out of date
+    ```
+
+The package and all its submodules are imported, the sync code of every sync compatible function transformed
+during the import (and the lazy ones, via `warmup`) is written into `<package>/__easy_sync__.py`. Ship that file
+with the package, then `@sync_compatible` picks the precompiled code up at import, without `inspect.getsource`
+and the AST work. A subpackage can be compiled on its own too, `python -m easy_sync.compile mypkg.sub` writes
+`mypkg/sub/__easy_sync__.py`.
+
+NOTE: the artifact is specific to the Python version it's generated with (like `.pyc` files), entries for another
+version are ignored and the functions are transformed at runtime as usual. Sync compatible functions defined
+inside other functions are decorated when the outer function runs, so they are not covered.
+'''
+
+import os
+import sys
+import marshal
+import argparse
+import importlib
+import pkgutil
+from types import ModuleType
+from easy_sync import precompiled, warmup
+from easy_sync.transform import _sync_code_memo
+
+
+def collect(package_name: str) -> tuple[ModuleType, dict[str, bytes]]:
+    ''' import the package and all its submodules, returns the package and the entries of the functions defined in it '''
+
+    precompiled._enabled = False # don't serve the (maybe outdated) existing artifacts
+    try:
+        package = importlib.import_module(package_name)
+        if not hasattr(package, '__path__'):
+            raise ValueError(f"[easy_sync.compile]: {package_name!r} is not a package")
+
+        modules = [package]
+        for info in pkgutil.walk_packages(package.__path__, package.__name__ + '.'):
+            if info.name.rpartition('.')[2] != precompiled.ARTIFACT_MODULE:
+                modules.append(importlib.import_module(info.name))
+        for module in modules:
+            warmup(module)
+    finally:
+        precompiled._enabled = True
+
+    directories = tuple(os.path.join(os.path.abspath(p), '') for p in package.__path__)
+    entries : dict[str, bytes] = {}
+    for (code, context), entry in list(_sync_code_memo.items()):
+        if os.path.abspath(code.co_filename).startswith(directories):
+            entries[precompiled.fingerprint(code, context.cache_key())] = marshal.dumps(entry)
+    return package, entries
+
+
+def render(package_name: str, entries: dict[str, bytes]) -> str:
+    lines = [
+        f"# generated by `python -m easy_sync.compile {package_name}`, do not edit",
+        f"FORMAT = {precompiled.FORMAT!r}",
+        f"CACHE_TAG = {sys.implementation.cache_tag!r}",
+        "ENTRIES = {",
+        *(f"    {key!r}: {entries[key]!r}," for key in sorted(entries)),
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def is_up_to_date(path: str, entries: dict[str, bytes]) -> bool:
+    '''
+    compare the keys only, since the keys cover the code of the async functions and the transform context,
+    while the marshalled code objects are not guaranteed to be byte-for-byte reproducible
+    '''
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            namespace : dict[str, object] = {}
+            exec(f.read(), namespace)
+    except OSError:
+        return False
+    return (
+        namespace.get('FORMAT') == precompiled.FORMAT and
+        namespace.get('CACHE_TAG') == sys.implementation.cache_tag and
+        set(namespace.get('ENTRIES', {})) == set(entries) #type: ignore
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m easy_sync.compile', description="Generate the sync code of a package ahead of time")
+    parser.add_argument('package', help="the importable name of the package")
+    parser.add_argument('--check', action='store_true', help="don't write anything, exit with 1 if the artifact is out of date")
+    args = parser.parse_args(argv)
+
+    package, entries = collect(args.package)
+    path = os.path.join(os.path.dirname(os.path.abspath(package.__file__ or '')), precompiled.ARTIFACT_MODULE + '.py')
+
+    if args.check:
+        if is_up_to_date(path, entries):
+            print(f"{path} is up to date ({len(entries)} functions)")
+            return 0
+        print(f"{path} is out of date, run `python -m easy_sync.compile {args.package}` to regenerate it")
+        return 1
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render(args.package, entries))
+    print(f"{path} written ({len(entries)} functions)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
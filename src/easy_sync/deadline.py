@@ -0,0 +1,84 @@
+'''
+Deadlines of sync calls, the sync counterpart of `asyncio.timeout`
+
+The deadline is held by a context variable, so that it propagates implicitly through the sync call chain, including
+the sub-calls running on the thread pool of `easy_sync.runtime` (each runs in a copy of the current context).
+Unlike asyncio, a sync call cannot be interrupted, so the deadline is checked cooperatively: by every `.wait()`,
+by the sync version of `asyncio.sleep`, and by the blocking helpers of `easy_sync.runtime`, which also limit their
+blocking to the remaining time. They raise `TimeoutError` once the deadline has passed (`DeadlineExceeded`, which
+is also an `asyncio.TimeoutError` before python 3.11).
+
+    ```
+    async_fetch(url).wait(timeout=2.0)
+
+    with easy_sync.runtime.timeout(2.0):
+        a = async_fetch(url_a).wait()
+        b = async_fetch(url_b).wait()
+    ```
+'''
+
+import sys
+import asyncio
+from time import monotonic
+from contextvars import ContextVar
+from types import TracebackType
+
+# the monotonic time by which the current sync call must finish, None means no deadline
+_deadline : ContextVar[float | None] = ContextVar('easy_sync_deadline', default=None)
+
+if sys.version_info >= (3, 11):
+    DeadlineExceeded = TimeoutError
+else: #pragma: no cover
+    class DeadlineExceeded(asyncio.TimeoutError, TimeoutError):
+        '''
+        `asyncio.TimeoutError` is an alias of the builtin `TimeoutError` since python 3.11 only, before that the sync
+        versions raise this, so that the `except asyncio.TimeoutError:` of the async code still catches the timeouts
+        '''
+
+
+def get_deadline() -> float | None:
+    return _deadline.get()
+
+
+def remaining() -> float | None:
+    ''' seconds left before the current deadline (never negative), None if there is no deadline '''
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - monotonic())
+
+
+def check() -> None:
+    ''' raise `DeadlineExceeded` (i.e. `TimeoutError`) if the current deadline has passed '''
+    deadline = _deadline.get()
+    if deadline is not None and monotonic() >= deadline:
+        raise DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed")
+
+
+class timeout:
+    '''
+    Sync version of `asyncio.timeout(delay)`, sets a deadline `delay` seconds later for the calls inside the `with` block
+
+    A nested deadline never extends the outer one. `None` means no (additional) deadline.
+    '''
+
+    __slots__ = ('_delay', '_token')
+
+    def __init__(self, delay: float | None):
+        self._delay = delay
+
+    def __enter__(self) -> 'timeout':
+        outer = _deadline.get()
+        if self._delay is None:
+            deadline = outer
+        else:
+            deadline = monotonic() + self._delay
+            if outer is not None and outer < deadline:
+                deadline = outer
+        if deadline is not None and monotonic() >= deadline:
+            raise DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed")
+        self._token = _deadline.set(deadline)
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None) -> None:
+        _deadline.reset(self._token)
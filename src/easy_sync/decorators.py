@@ -0,0 +1,147 @@
+'''
+Dual-mode decorators, which keep working in the generated sync version
+
+The transformer removes the decorators from the generated sync code, since they are designed for async functions.
+A decorator can provide a sync half via the `__sync_decorator__` attribute of the async wrapper it returns, which
+is applied to the sync version. `dual_decorator(async_decorator, sync_decorator)` builds such a decorator:
+
+    ```
+    def timed(fn):
+        ...
+
+    def async_timed(fn):
+        ...
+
+    @sync_compatible
+    @dual_decorator(async_timed, timed)
+    async def fetch(url: str) -> bytes:
+        ...
+    ```
+
+The decorator order matters as usual, the dual-mode decorators must be applied below `@sync_compatible`. They can
+decorate the methods of a `@sync_compatible` class too.
+'''
+
+import asyncio
+import inspect
+import threading
+from time import monotonic, sleep
+from weakref import WeakKeyDictionary
+from functools import wraps
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar, ParamSpec
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+AsyncDecorator = Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]
+SyncDecorator = Callable[[Callable[..., Any]], Callable[..., Any]]
+
+
+def dual_decorator(async_decorator: AsyncDecorator, sync_decorator: SyncDecorator) -> AsyncDecorator:
+    ''' combine the async and sync halves of a decorator, the sync half is applied to the generated sync version '''
+
+    def decorator(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        if inspect.isasyncgenfunction(fn):
+            raise TypeError("[dual_decorator()]: async generator functions are not supported")
+        wrapper = async_decorator(fn)
+        wrapper.__sync_decorator__ = sync_decorator #type: ignore
+        return wrapper
+    return decorator
+
+
+def concurrency_limit(limit: int) -> AsyncDecorator:
+    '''
+    Limit the number of concurrent calls, via `asyncio.Semaphore` in the async version and `threading.Semaphore`
+    in the sync version
+
+    The limits of the two versions are separate. Keep the returned decorator to share a limit among functions:
+
+        ```
+        db_limit = concurrency_limit(10)
+
+        @sync_compatible
+        @db_limit
+        async def query(sql: str) -> list[Row]:
+            ...
+        ```
+    '''
+
+    sync_semaphore = threading.Semaphore(limit)
+    #NOTE: an asyncio semaphore is bound to the event loop using it, so there is one per loop
+    async_semaphores : WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = WeakKeyDictionary()
+    lock = threading.Lock()
+
+    def async_semaphore() -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with lock:
+            semaphore = async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = async_semaphores[loop] = asyncio.Semaphore(limit)
+            return semaphore
+
+    def async_decorator(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @wraps(fn)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            async with async_semaphore():
+                return await fn(*args, **kwargs)
+        return wrapper
+
+    def sync_decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with sync_semaphore:
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return dual_decorator(async_decorator, sync_decorator)
+
+
+class _TokenBucket:
+    ''' allows bursts of `calls` calls, refilled at the rate of `calls` per `period` seconds '''
+
+    def __init__(self, calls: int, period: float):
+        self.rate = calls / period
+        self.capacity = float(calls)
+        self.tokens = float(calls)
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        ''' take a token, returns the seconds to wait before it's available '''
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def rate_limit(calls: int, period: float = 1.0) -> AsyncDecorator:
+    '''
+    Limit the call rate to `calls` per `period` seconds, the callers beyond the limit wait (sleep) for their turn
+
+    Unlike `concurrency_limit`, the same limit is shared by the sync and async versions.
+    '''
+
+    bucket = _TokenBucket(calls, period)
+
+    def async_decorator(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @wraps(fn)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            delay = bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await fn(*args, **kwargs)
+        return wrapper
+
+    def sync_decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            delay = bucket.reserve()
+            if delay > 0:
+                sleep(delay)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    return dual_decorator(async_decorator, sync_decorator)
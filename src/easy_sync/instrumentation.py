@@ -0,0 +1,191 @@
+'''
+Opt-in instrumentation of the sync compatible functions
+
+Hooks observe every call going through `Waitable.wait()` (mode "sync") and `await Waitable` (mode "async"),
+including the shared (`.shared()`) and started (`.start()`) ones,
+and every transformation done by `transform_function_to_sync`:
+
+    ```
+    collector = MetricsCollector()
+    add_hook(collector)
+    ...
+    print(collector.snapshot())
+    ```
+
+While no hook is installed, the original methods of `Waitable` are used as is, so the overhead is zero.
+Installing the first hook swaps in the instrumented methods, and removing the last one swaps them back.
+
+NOTE: the calls between sync compatible functions inside the generated sync code (`f.__sync__(x)`) don't
+go through `Waitable`, so only the outermost `.wait()` of a sync call chain is observed.
+'''
+
+import bisect
+import threading
+from time import perf_counter
+from collections.abc import Callable, Generator
+from typing import Any, Literal, Protocol, TypeAlias
+from easy_sync.waitable import Waitable, SharedWaitable, StartedWaitable
+
+Mode : TypeAlias = Literal['sync', 'async']
+
+# upper bounds (in seconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS : tuple[float, ...] = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+
+
+class CallHook(Protocol):
+    ''' The hook interface, `MetricsCollector` is a ready-made implementation '''
+
+    def on_call_start(self, fn: Callable[..., Any], mode: Mode) -> None:
+        ...
+
+    def on_call_end(self, fn: Callable[..., Any], mode: Mode, elapsed: float, error: BaseException | None) -> None:
+        ...
+
+    def on_transform(self, fn: Callable[..., Any], elapsed: float) -> None:
+        ...
+
+
+_hooks : tuple[CallHook, ...] = () # replaced as a whole, so that the readers need no lock
+_hooks_lock = threading.Lock()
+
+def _instrumented_wait(original_wait: Callable[..., Any]) -> Callable[..., Any]:
+    def instrumented_wait(self: Waitable[Any], timeout: float | None = None) -> Any:
+        hooks, fn = _hooks, self._async_fn
+        for hook in hooks:
+            hook.on_call_start(fn, 'sync')
+        error = None
+        start = perf_counter()
+        try:
+            return original_wait(self, timeout)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            for hook in hooks:
+                hook.on_call_end(fn, 'sync', elapsed, error)
+    return instrumented_wait
+
+
+def _instrumented_await(original_await: Callable[..., Any]) -> Callable[..., Any]:
+    def instrumented_await(self: Waitable[Any]) -> Generator[Any, Any, Any]:
+        hooks, fn = _hooks, self._async_fn
+        for hook in hooks:
+            hook.on_call_start(fn, 'async')
+        error = None
+        start = perf_counter()
+        try:
+            return (yield from original_await(self))
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            #NOTE: the elapsed time includes the time the coroutine spent suspended, i.e. it's the latency seen by the caller
+            elapsed = perf_counter() - start
+            for hook in hooks:
+                hook.on_call_end(fn, 'async', elapsed, error)
+    return instrumented_await
+
+
+# class -> {method name: (original method, instrumented method)}, the subclasses override both methods of `Waitable`
+_patches : dict[type, dict[str, tuple[Callable[..., Any], Callable[..., Any]]]] = {
+    cls: {
+        'wait': (cls.__dict__['wait'], _instrumented_wait(cls.__dict__['wait'])),
+        '__await__': (cls.__dict__['__await__'], _instrumented_await(cls.__dict__['__await__'])),
+    }
+    for cls in (Waitable, SharedWaitable, StartedWaitable)
+}
+
+
+def add_hook(hook: CallHook) -> None:
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+        for cls, methods in _patches.items():
+            for name, (_, instrumented) in methods.items():
+                setattr(cls, name, instrumented)
+
+
+def remove_hook(hook: CallHook) -> None:
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(h for h in _hooks if h is not hook)
+        if not _hooks:
+            for cls, methods in _patches.items():
+                for name, (original, _) in methods.items():
+                    setattr(cls, name, original)
+
+
+def record_transform(fn: Callable[..., Any], elapsed: float) -> None:
+    for hook in _hooks:
+        hook.on_transform(fn, elapsed)
+
+
+def _function_name(fn: Callable[..., Any]) -> str:
+    return f"{getattr(fn, '__module__', '?')}.{getattr(fn, '__qualname__', repr(fn))}"
+
+
+class FunctionMetrics:
+    ''' The metrics of a single function, collected by `MetricsCollector` '''
+
+    __slots__ = ('calls', 'errors', 'total_time', 'histogram', 'transform_time')
+
+    def __init__(self) -> None:
+        self.calls : dict[Mode, int] = {'sync': 0, 'async': 0}
+        self.errors : dict[Mode, int] = {'sync': 0, 'async': 0}
+        self.total_time : dict[Mode, float] = {'sync': 0.0, 'async': 0.0}
+        self.histogram : dict[Mode, list[int]] = {'sync': [0] * (len(LATENCY_BUCKETS) + 1), 'async': [0] * (len(LATENCY_BUCKETS) + 1)}
+        self.transform_time = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'calls': dict(self.calls),
+            'errors': dict(self.errors),
+            'total_time': dict(self.total_time),
+            'histogram': {mode: list(counts) for mode, counts in self.histogram.items()},
+            'transform_time': self.transform_time,
+        }
+
+
+class MetricsCollector:
+    '''
+    An in-memory hook which collects per function call counts, error counts, latency histograms of each mode,
+    and transformation time
+
+    `snapshot()` returns the metrics keyed by "module.qualname", the histogram buckets are given by `LATENCY_BUCKETS`.
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics : dict[str, FunctionMetrics] = {}
+
+    def _get(self, fn: Callable[..., Any]) -> FunctionMetrics:
+        name = _function_name(fn)
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            metrics = self._metrics[name] = FunctionMetrics()
+        return metrics
+
+    def on_call_start(self, fn: Callable[..., Any], mode: Mode) -> None:
+        pass
+
+    def on_call_end(self, fn: Callable[..., Any], mode: Mode, elapsed: float, error: BaseException | None) -> None:
+        with self._lock:
+            metrics = self._get(fn)
+            metrics.calls[mode] += 1
+            metrics.total_time[mode] += elapsed
+            metrics.histogram[mode][bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            if error is not None:
+                metrics.errors[mode] += 1
+
+    def on_transform(self, fn: Callable[..., Any], elapsed: float) -> None:
+        with self._lock:
+            self._get(fn).transform_time += elapsed
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {name: metrics.as_dict() for name, metrics in self._metrics.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
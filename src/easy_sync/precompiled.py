@@ -0,0 +1,112 @@
+'''
+Precompiled sync code generated ahead of time by `python -m easy_sync.compile <package>`
+
+The generated artifact is a plain module `<package>/__easy_sync__.py` (the package can be a subpackage), which is shipped (and byte-compiled)
+along with the package, so it works in sourceless and zipapp builds too. The entries are keyed by the
+fingerprint of the async code object and the transform context, so that they can be found without the source code.
+When an entry is found, `transform_function_to_sync` uses it directly and no AST work happens at runtime.
+'''
+
+import sys
+import hashlib
+import marshal
+import importlib
+import threading
+from types import CodeType
+from collections.abc import Callable
+from typing import Any
+
+ARTIFACT_MODULE = '__easy_sync__'
+FORMAT = '1' # bump this when the layout of the artifact changes
+
+# package name -> entries of its artifact (None if the package has no usable artifact)
+_artifacts : dict[str, dict[str, bytes] | None] = {}
+_artifacts_lock = threading.Lock()
+_enabled = True # turned off by `python -m easy_sync.compile` while collecting, so that the existing artifacts are not served
+
+
+def fingerprint(code: CodeType, context_key: str) -> str:
+    '''
+    a digest of the async code object (excluding the filename, which depends on where the package is installed)
+    and everything else which affects the generated code
+    '''
+
+    h = hashlib.sha256()
+    h.update(f"{FORMAT}\0{sys.implementation.cache_tag}\0{context_key}\0".encode('utf-8', 'surrogatepass'))
+    _hash_code(h, code)
+    return h.hexdigest()
+
+
+def _hash_code(h: Any, code: CodeType) -> None:
+    h.update(code.co_code)
+    for part in (code.co_name, code.co_qualname if sys.version_info >= (3, 11) else '', code.co_firstlineno, code.co_argcount,
+                 code.co_posonlyargcount, code.co_kwonlyargcount, code.co_flags, code.co_names, code.co_varnames,
+                 code.co_freevars, code.co_cellvars):
+        h.update(repr(part).encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _hash_code(h, const)
+        elif isinstance(const, frozenset):
+            #NOTE: the iteration order of a frozenset of strings depends on the hash seed
+            h.update(repr(sorted(map(repr, const))).encode('utf-8', 'surrogatepass'))
+        else:
+            h.update(repr(const).encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+
+
+def _with_filename(code: CodeType, filename: str) -> CodeType:
+    consts = tuple(_with_filename(c, filename) if isinstance(c, CodeType) else c for c in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def _packages_of(module_name: str) -> list[str]:
+    ''' the packages which may hold the artifact of a module, the innermost first: "a.b.c" -> ["a.b.c", "a.b", "a"] '''
+    parts = module_name.split('.')
+    names = ['.'.join(parts[:i]) for i in range(len(parts), 0, -1)]
+    # the modules which are not packages (i.e. have no `__path__`) cannot hold an artifact
+    return [name for name in names if name not in sys.modules or hasattr(sys.modules[name], '__path__')]
+
+
+def _artifact_of(package: str) -> dict[str, bytes] | None:
+    try:
+        return _artifacts[package]
+    except KeyError:
+        pass
+
+    with _artifacts_lock:
+        if package not in _artifacts:
+            entries = None
+            try:
+                artifact = importlib.import_module(f"{package}.{ARTIFACT_MODULE}")
+            except ImportError:
+                pass
+            else:
+                if getattr(artifact, 'FORMAT', None) == FORMAT and getattr(artifact, 'CACHE_TAG', None) == sys.implementation.cache_tag:
+                    entries = artifact.ENTRIES
+            _artifacts[package] = entries
+        return _artifacts[package]
+
+
+def lookup(func: Callable[..., Any], context_key: str) -> Any | None:
+    '''
+    the precompiled entry of the function, None if there is no artifact or it doesn't contain the function
+
+    The artifacts of all the enclosing packages are looked up, since `python -m easy_sync.compile` can be run for
+    a subpackage as well as for the top-level package.
+    '''
+
+    if not _enabled:
+        return None
+    key = None
+    for package in _packages_of(func.__module__):
+        entries = _artifact_of(package)
+        if not entries:
+            continue
+        if key is None:
+            key = fingerprint(func.__code__, context_key)
+        data = entries.get(key)
+        if data is not None:
+            sync_code, extras = marshal.loads(data)
+            return _with_filename(sync_code, func.__code__.co_filename), extras
+    return None
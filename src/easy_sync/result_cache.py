@@ -0,0 +1,151 @@
+'''
+A bounded LRU + TTL cache of results, shared by the sync and async paths of sync compatible functions
+
+    ```
+    @sync_compatible(cache=ResultCache(maxsize=1024, ttl=60))
+    async def get_user(user_id: int) -> User:
+        ...
+    ```
+
+Concurrent calls with the same arguments are collapsed into one execution (single-flight): the first caller runs
+the function, the others wait for its result, via `concurrent.futures.Future` which can be waited from threads
+(`.result()`) and awaited from any event loop (`asyncio.wrap_future`). Exceptions are propagated to all the callers
+of the same flight, but not cached.
+'''
+
+import asyncio
+import threading
+from time import monotonic
+from collections import OrderedDict
+from concurrent.futures import Future
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+from easy_sync.waitable import _future_result
+
+R = TypeVar("R")
+
+_MISSING : Any = object()
+_KWARGS_MARK = object()
+
+
+class _Flight:
+    ''' an execution in progress '''
+
+    __slots__ = ('future', 'thread', 'blocking')
+
+    def __init__(self, blocking: bool):
+        self.future : Future[Any] = Future()
+        self.thread = threading.get_ident()
+        self.blocking = blocking # whether the owner blocks its thread, i.e. runs the sync version
+
+
+class ResultCache:
+    '''
+    A thread-safe LRU cache with an optional TTL (in seconds), `maxsize=None` means unbounded
+
+    The same instance can be shared by several functions, the function is part of the key.
+    '''
+
+    def __init__(self, maxsize: int | None = 128, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data : OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._in_flight : dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    @staticmethod
+    def make_key(fn: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]) -> Hashable | None:
+        ''' returns None if the arguments are not hashable, then the cache is bypassed '''
+        key = (fn, *args, _KWARGS_MARK, *kwargs.items()) if kwargs else (fn, *args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _join(self, key: Hashable, blocking: bool) -> tuple[Any, _Flight | None, bool]:
+        ''' returns (cached value, flight, whether the caller owns the flight) '''
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value, None, False
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                return _MISSING, flight, False
+            flight = self._in_flight[key] = _Flight(blocking)
+            return _MISSING, flight, True
+
+    def _finish(self, key: Hashable, flight: _Flight, value: Any = _MISSING, error: BaseException | None = None) -> None:
+        with self._lock:
+            if error is None:
+                self._data[key] = (value, None if self.ttl is None else monotonic() + self.ttl)
+                self._data.move_to_end(key)
+                if self.maxsize is not None:
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            self._in_flight.pop(key, None)
+        if error is None:
+            flight.future.set_result(value)
+        else:
+            flight.future.set_exception(error)
+
+    def get_sync(self, key: Hashable | None, compute: Callable[[], R]) -> R:
+        if key is None:
+            return compute()
+
+        value, flight, owner = self._join(key, blocking=True)
+        if flight is None:
+            return value
+        if not owner:
+            if flight.thread == threading.get_ident():
+                # the owner runs on this thread (e.g. a task of the event loop we are blocking), waiting would deadlock
+                return compute()
+            return _future_result(flight.future) # waits no longer than the deadline of the caller
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, value)
+        return value
+
+    async def get_async(self, key: Hashable | None, compute: Callable[[], Awaitable[R]]) -> R:
+        if key is None:
+            return await compute()
+
+        value, flight, owner = self._join(key, blocking=False)
+        if flight is None:
+            return value
+        if not owner:
+            if flight.blocking and flight.thread == threading.get_ident():
+                # the owner is blocked by the sync call which runs this event loop, waiting would deadlock
+                return await compute()
+            #NOTE: shielded, so that a cancelled waiter doesn't cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(flight.future))
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, value)
+        return value
@@ -0,0 +1,389 @@
+'''
+Runtime helpers referred by the generated sync code (as `_easy_sync.xxx`)
+
+`resolve(x)` is the sync version of `await x` when x is not known to be sync compatible.
+
+The async code expresses concurrency via `asyncio.gather`, `asyncio.create_task` and `asyncio.TaskGroup`,
+their sync translations here run the sync versions of the sub-calls concurrently on a thread pool.
+
+The timeouts (`asyncio.timeout`, `asyncio.wait_for`) are translated into deadlines, see `easy_sync.deadline`,
+the blocking helpers here wait no longer than the current deadline.
+'''
+
+import time
+import queue
+import asyncio
+import builtins
+import inspect
+import threading
+import multiprocessing
+import contextvars
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED, FIRST_EXCEPTION
+from types import TracebackType
+from typing import Any, Generic, Literal, TypeVar, overload
+from easy_sync import deadline
+from easy_sync.waitable import Waitable, _future_result
+from easy_sync.background_loop import run_coroutine
+
+R = TypeVar("R")
+
+#NOTE: re-exported by assignment rather than imported by name, the `timeout` parameters below would shadow the import
+timeout = deadline.timeout # sync version of `asyncio.timeout`
+
+_executor : Executor | None = None
+_process_executor : Executor | None = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def set_executor(executor: Executor | None) -> None:
+    '''
+    Set the executor used to run the sync versions of `asyncio.gather` / `create_task` / `TaskGroup`,
+    and the `@async_compatible` functions when awaited
+
+    `None` means using the default `ThreadPoolExecutor`, which is created on first use.
+    '''
+
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(thread_name_prefix='easy_sync')
+    return _executor
+
+
+def set_process_executor(executor: Executor | None) -> None:
+    '''
+    Set the executor used by `@async_compatible(executor="process")` functions when awaited
+
+    `None` means using the default `ProcessPoolExecutor`, which is created on first use, and starts its workers
+    with "forkserver" (or "spawn" where not available) rather than forking the threads of the current process.
+    '''
+
+    global _process_executor
+    with _executor_lock:
+        _process_executor = executor
+
+
+def get_process_executor() -> Executor:
+    global _process_executor
+    if _process_executor is None:
+        with _executor_lock:
+            if _process_executor is None:
+                #NOTE: forking a process with the running worker threads (and the background loop) may deadlock the child
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _process_executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context(start_method))
+    return _process_executor
+
+
+def _run_in_worker(fn: Callable[..., R], /, *args: Any, **kwargs: Any) -> R:
+    _local.in_worker = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _local.in_worker = False
+
+
+def _submit(waitable: Any) -> 'Future[Any]':
+    if not hasattr(waitable, 'wait'):
+        raise TypeError(f"[easy_sync]: {waitable!r} is not sync compatible, only the calls of `@sync_compatible` functions can run concurrently in the sync version")
+    return _submit_call(waitable.wait)
+
+
+def _submit_call(fn: Callable[..., R], /, *args: Any, **kwargs: Any) -> 'Future[R]':
+    if getattr(_local, 'in_worker', False):
+        #NOTE: already inside a worker thread, run inline to avoid exhausting (and deadlocking) a bounded pool
+        future : Future[R] = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    # like asyncio tasks, each sub-call runs in a copy of the current context
+    return get_executor().submit(contextvars.copy_context().run, _run_in_worker, fn, *args, **kwargs)
+
+
+class Task(Generic[R]):
+    ''' The sync counterpart of `asyncio.Task`, `await task` is translated into `task.wait()` '''
+
+    __slots__ = ('_future',)
+
+    def __init__(self, future: 'Future[R]'):
+        self._future = future
+
+    def wait(self, timeout: float | None = None) -> R:
+        with deadline.timeout(timeout):
+            return _future_result(self._future)
+
+    def result(self) -> R:
+        return self._future.result()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        ''' only the tasks not started yet can be cancelled '''
+        return self._future.cancel()
+
+
+def create_task(waitable: Any) -> Task[Any]:
+    ''' sync version of `asyncio.create_task(f(x))`, starts running `f(x).wait()` in background '''
+    return Task(_submit(waitable))
+
+
+def gather(*waitables: Any, return_exceptions: bool = False) -> list[Any]:
+    ''' sync version of `asyncio.gather(f(x), g(y))`, runs `f(x).wait()` and `g(y).wait()` concurrently '''
+
+    futures = [w._future if isinstance(w, Task) else _submit(w) for w in waitables]
+    if return_exceptions:
+        _, not_done = wait(futures, timeout=deadline.remaining())
+        _check_all_done(not_done)
+        return [f.exception() or f.result() for f in futures]
+
+    done, not_done = wait(futures, timeout=deadline.remaining(), return_when=FIRST_EXCEPTION)
+    for f in futures:
+        if f in done and f.exception() is not None:
+            raise f.exception() #type: ignore
+    _check_all_done(not_done)
+    return [f.result() for f in futures]
+
+
+def _check_all_done(not_done: 'set[Future[Any]]') -> None:
+    ''' the waiting for the futures was stopped by the deadline if some are not done, cancel them (if not started yet) and raise '''
+    if not_done:
+        for f in not_done:
+            f.cancel()
+        raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed")
+
+
+class TaskGroup:
+    ''' sync version of `asyncio.TaskGroup`, leaving the `with` block waits for all the tasks created '''
+
+    def __init__(self):
+        self._tasks : list[Task[Any]] = []
+
+    def __enter__(self) -> 'TaskGroup':
+        return self
+
+    def create_task(self, waitable: Any) -> Task[Any]:
+        task = create_task(waitable)
+        self._tasks.append(task)
+        return task
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None) -> None:
+        futures = [t._future for t in self._tasks]
+        if exc is not None:
+            for f in futures:
+                f.cancel()
+        _, not_done = wait(futures, timeout=deadline.remaining())
+
+        if exc is not None:
+            return # the error raised inside the `with` block takes precedence
+        _check_all_done(not_done)
+
+        errors = [e for f in futures if not f.cancelled() and (e := f.exception()) is not None]
+        if errors:
+            exception_group = getattr(builtins, 'ExceptionGroup', None) # python 3.11+
+            if exception_group is not None:
+                raise exception_group("unhandled errors in a TaskGroup", errors)
+            raise errors[0] #pragma: no cover
+
+
+def resolve(value: Any) -> Any:
+    '''
+    sync version of `await value`, used when the awaited value is not known to be sync compatible
+
+    Waitables are waited, coroutines run on the background event loop, other values are returned as is, since they come from the sync equivalents
+    of async APIs, e.g. `await event.wait()` where `event` is a `threading.Event` in the sync version.
+    '''
+
+    if isinstance(value, (Waitable, Task)):
+        return value.wait()
+    if inspect.iscoroutine(value):
+        # not transformable, run it on the shared background event loop
+        return run_coroutine(value)
+    if inspect.isawaitable(value):
+        raise TypeError(f"[easy_sync]: cannot wait for {value!r} in the sync version, make it sync compatible or register a substitution for it")
+    return value
+
+
+def sleep(delay: float, result: Any = None) -> Any:
+    '''
+    sync version of `asyncio.sleep(delay)`, which honors the current deadline
+
+    If the deadline comes before the end of the sleep, it raises `TimeoutError` right away instead of sleeping in vain.
+    '''
+
+    remaining = deadline.remaining()
+    if remaining is not None and delay >= remaining:
+        raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call comes before the end of the sleep")
+    if delay > 0:
+        time.sleep(delay)
+    return result
+
+
+class DeferredCall:
+    '''
+    A call postponed by the generated code of `await asyncio.wait_for(f(x), timeout)`, which becomes
+    `_easy_sync.wait_for(_easy_sync.DeferredCall(f, x), timeout)`, so that the call is made once the deadline is set
+    '''
+
+    __slots__ = ('_fn', '_args', '_kwargs')
+
+    def __init__(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any):
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+
+    def __call__(self) -> Any:
+        fn, args, kwargs = self._fn, self._args, self._kwargs
+        remaining = deadline.remaining()
+        if remaining is None or 'timeout' in kwargs or not _takes_timeout(fn):
+            return fn(*args, **kwargs)
+
+        # a blocking method of a sync primitive, which ignores the deadline, but takes a timeout
+        try:
+            result = fn(*args, timeout=remaining, **kwargs)
+        except (queue.Empty, queue.Full):
+            raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed") from None
+        if result is False:
+            raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed")
+        return result
+
+
+# the blocking methods of the sync equivalents of the asyncio primitives (see `easy_sync.substitutions`), which take
+# a timeout and either raise (the queues) or return False when it expires
+_TIMEOUT_METHODS : frozenset[Any] = frozenset([
+    queue.Queue.get, queue.Queue.put, threading.Event.wait, threading.Condition.wait, threading.Semaphore.acquire,
+])
+_LOCK_TYPES = (type(threading.Lock()), type(threading.RLock()))
+
+
+def _takes_timeout(fn: Callable[..., Any]) -> bool:
+    if getattr(fn, '__func__', None) in _TIMEOUT_METHODS:
+        return True
+    return isinstance(getattr(fn, '__self__', None), _LOCK_TYPES) and getattr(fn, '__name__', None) == 'acquire'
+
+
+def wait_for(value: Any, timeout: float | None) -> Any:
+    '''
+    sync version of `asyncio.wait_for(f(x), timeout)`, waits for `f(x)` with a deadline `timeout` seconds later
+
+    The generated code passes the call as a `DeferredCall`, so that it's made after the deadline is set. The blocking
+    methods of the sync primitives (e.g. `queue.Queue.get`, `threading.Event.wait`) are given the remaining time as
+    their timeout, since they don't check the deadline.
+    '''
+    with deadline.timeout(timeout):
+        if isinstance(value, DeferredCall):
+            value = value()
+        return resolve(value)
+
+
+@overload
+def run_many(waitables: Iterable[Waitable[R]], max_concurrency: int = 16, mode: Literal['thread'] = 'thread', ordered: bool = True) -> Iterator[R]:
+    ... # pragma: no cover
+
+@overload
+def run_many(waitables: Iterable[Awaitable[R]], max_concurrency: int = 16, *, mode: Literal['async'], ordered: bool = True) -> AsyncIterator[R]:
+    ... # pragma: no cover
+
+def run_many(waitables: Iterable[Any], max_concurrency: int = 16, mode: Literal['thread', 'async'] = 'thread', ordered: bool = True) -> Iterator[Any] | AsyncIterator[Any]:
+    '''
+    Run many waitables with at most `max_concurrency` of them running at the same time, the results are streamed
+
+        ```
+        for user in run_many((fetch_user(i) for i in ids), max_concurrency=32):
+            ...
+
+        async for user in run_many([fetch_user(i) for i in ids], max_concurrency=32, mode="async"):
+            ...
+        ```
+
+    In the "thread" mode, `.wait()` of the waitables run on the executor (see `set_executor`) and the results are
+    iterated via `for`. In the "async" mode, the waitables (or any awaitables) run as tasks of the current event loop
+    and the results are iterated via `async for`. The results are yielded in the order of the input if `ordered`,
+    otherwise as soon as they complete. The input is consumed lazily, so it can be a generator of any length.
+
+    The first error is raised by the iteration, the waitables not started yet are dropped then, and so are they
+    when the iteration stops early.
+    '''
+
+    if max_concurrency < 1:
+        raise ValueError(f"[easy_sync.run_many()]: max_concurrency must be positive, got {max_concurrency}")
+    if mode == 'thread':
+        return _run_many_in_threads(iter(waitables), max_concurrency, ordered)
+    if mode == 'async':
+        return _run_many_in_tasks(iter(waitables), max_concurrency, ordered)
+    raise ValueError(f"[easy_sync.run_many()]: mode must be 'thread' or 'async', got {mode!r}")
+
+
+def _run_many_in_threads(waitables: Iterator[Any], max_concurrency: int, ordered: bool) -> Iterator[Any]:
+    running : deque[Future[Any]] = deque() # in the order of the input
+    try:
+        for waitable in waitables:
+            running.append(_submit(waitable))
+            if len(running) >= max_concurrency:
+                yield from _take_done(running, ordered)
+        while running:
+            yield from _take_done(running, ordered)
+    finally:
+        for future in running:
+            future.cancel()
+
+
+def _take_done(running: 'deque[Future[Any]]', ordered: bool) -> list[Any]:
+    ''' wait for the first result (of the input order if ordered), take the results ready from `running` '''
+
+    if ordered:
+        result = _future_result(running[0])
+        running.popleft()
+        return [result]
+
+    done, not_done = wait(running, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+    if not done:
+        _check_all_done(not_done)
+    return _pop_done(running, done)
+
+
+async def _run_many_in_tasks(waitables: Iterator[Any], max_concurrency: int, ordered: bool) -> AsyncIterator[Any]:
+    running : deque[asyncio.Future[Any]] = deque() # in the order of the input
+    try:
+        for waitable in waitables:
+            running.append(asyncio.ensure_future(waitable))
+            if len(running) >= max_concurrency:
+                for result in await _take_done_tasks(running, ordered):
+                    yield result
+        while running:
+            for result in await _take_done_tasks(running, ordered):
+                yield result
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def _take_done_tasks(running: 'deque[asyncio.Future[Any]]', ordered: bool) -> list[Any]:
+    if ordered:
+        result = await running[0]
+        running.popleft()
+        return [result]
+
+    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    return _pop_done(running, done)
+
+
+def _pop_done(running: 'deque[Any]', done: 'set[Any]') -> list[Any]:
+    ''' remove the done futures from `running` and return their results (in the order of the input), raise the first error '''
+    results = [f.result() for f in running if f in done]
+    not_done = [f for f in running if f not in done]
+    running.clear()
+    running.extend(not_done)
+    return results
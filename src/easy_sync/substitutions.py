@@ -0,0 +1,155 @@
+'''
+Registry of async APIs and their sync equivalents, used by the generated sync code
+
+When the transformer finds an expression referring to a registered async API (e.g. `asyncio.Lock`, or
+`Lock` after `from asyncio import Lock`), it is replaced by the sync equivalent (e.g. `threading.Lock`)
+in the sync version. An awaited call of a substituted API is not waited, since the sync equivalent is
+expected to return the result directly, e.g. `await asyncio.sleep(1)` becomes `_easy_sync.sleep(1)`.
+
+Libraries can register their own pairs:
+
+    ```
+    register_substitution(AsyncConnectionPool, SyncConnectionPool)
+    register_substitution("aiofiles.open", "builtins:open")
+    ```
+'''
+
+import sys
+import threading
+from typing import Any, TypeAlias
+
+# async API spec -> sync API spec ("module:qualname")
+_registry : dict[str, str] = {}
+_registry_lock = threading.Lock()
+
+Index : TypeAlias = tuple[tuple[int, int], dict[int, tuple[Any, str]]]
+
+# ((registry version, number of resolved entries), id of async API object -> (the object, sync API spec)),
+# with the number of modules imported when it was built, and the modules whose import may resolve more entries
+_index : tuple[Index, int, frozenset[str]] | None = None
+_version = 0
+
+
+def _spec_of(api: Any) -> str:
+    if isinstance(api, str):
+        return api
+    return f"{api.__module__}:{api.__qualname__}"
+
+
+def _sync_spec_of(api: Any) -> str:
+    spec = _spec_of(api)
+    if ':' not in spec:
+        # "threading.Lock" -> "threading:Lock"
+        module, _, qualname = spec.rpartition('.')
+        spec = f"{module}:{qualname}"
+    return spec
+
+
+def register_substitution(async_api: Any, sync_api: Any) -> None:
+    '''
+    Register a sync equivalent for an async API
+
+    Both sides can be either the object itself, or its import path as a string such as `"asyncio.Lock"`
+    or `"pkg.module:Class.method"`. Using strings for the async side avoids importing optional dependencies,
+    the entry takes effect once the module is imported by your code.
+    '''
+
+    global _version
+    with _registry_lock:
+        _registry[_spec_of(async_api)] = _sync_spec_of(sync_api)
+        _version += 1
+
+
+def unregister_substitution(async_api: Any) -> None:
+    global _version
+    with _registry_lock:
+        _registry.pop(_spec_of(async_api), None)
+        _version += 1
+
+
+def _resolve_loaded(spec: str) -> Any | None:
+    ''' resolve the spec without importing anything, return None if the module is not imported yet '''
+
+    if ':' in spec:
+        module_name, _, qualname = spec.partition(':')
+        parts = qualname.split('.')
+    else:
+        parts = spec.split('.')
+        for i in range(len(parts) - 1, 0, -1):
+            if '.'.join(parts[:i]) in sys.modules:
+                module_name, parts = '.'.join(parts[:i]), parts[i:]
+                break
+        else:
+            return None
+
+    obj = sys.modules.get(module_name)
+    for part in parts:
+        if obj is None:
+            return None
+        obj = getattr(obj, part, None)
+    return obj
+
+
+def _candidate_modules(spec: str) -> list[str]:
+    ''' the modules whose import may make the spec resolvable '''
+    if ':' in spec:
+        return [spec.partition(':')[0]]
+    parts = spec.split('.')
+    return ['.'.join(parts[:i]) for i in range(1, len(parts))]
+
+
+def substitution_index() -> Index:
+    '''
+    returns (version, id(async API object) -> (async API object, sync API spec)) for the entries resolvable at the moment
+
+    The version changes whenever the registry changes or more entries become resolvable. The unresolved entries are
+    retried only once one of their modules is imported, an entry whose modules are all imported but which doesn't
+    resolve (e.g. an API missing in this version of the library) is not retried until the registry changes.
+    '''
+
+    global _index
+    state = _index
+    if state is not None and state[0][0][0] == _version:
+        index, modules_count, waited = state
+        if len(sys.modules) == modules_count:
+            return index
+        if not any(module in sys.modules for module in waited):
+            _index = (index, len(sys.modules), waited)
+            return index
+
+    with _registry_lock:
+        modules_count = len(sys.modules)
+        resolved : dict[int, tuple[Any, str]] = {}
+        waiting : set[str] = set()
+        for async_spec, sync_spec in _registry.items():
+            obj = _resolve_loaded(async_spec)
+            if obj is not None:
+                resolved[id(obj)] = (obj, sync_spec)
+            else:
+                waiting.update(m for m in _candidate_modules(async_spec) if m not in sys.modules)
+        index = ((_version, len(resolved)), resolved)
+        _index = (index, modules_count, frozenset(waiting))
+    return index
+
+
+for _async_api, _sync_api in [
+    ("asyncio.sleep", "easy_sync.runtime:sleep"),
+    ("asyncio.wait_for", "easy_sync.runtime:wait_for"),
+    ("asyncio.gather", "easy_sync.runtime:gather"),
+    ("asyncio.create_task", "easy_sync.runtime:create_task"),
+    ("asyncio.Lock", "threading:Lock"),
+    ("asyncio.Event", "threading:Event"),
+    ("asyncio.Condition", "threading:Condition"),
+    ("asyncio.Semaphore", "threading:Semaphore"),
+    ("asyncio.BoundedSemaphore", "threading:BoundedSemaphore"),
+    ("asyncio.Queue", "queue:Queue"),
+    ("asyncio.LifoQueue", "queue:LifoQueue"),
+    ("asyncio.PriorityQueue", "queue:PriorityQueue"),
+    ("asyncio.QueueEmpty", "queue:Empty"),
+    ("asyncio.QueueFull", "queue:Full"),
+]:
+    register_substitution(_async_api, _sync_api)
+
+if sys.version_info >= (3, 11): # not in asyncio before
+    register_substitution("asyncio.timeout", "easy_sync.runtime:timeout")
+    register_substitution("asyncio.TaskGroup", "easy_sync.runtime:TaskGroup")
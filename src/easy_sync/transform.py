@@ -1,194 +1,872 @@
 import inspect
 import ast
 import sys
-from collections.abc import Awaitable, Callable
-from typing import Any, TypeVar, ParamSpec
+import builtins
+import importlib
+from collections.abc import Awaitable, Callable, Iterator
+from types import CellType, CodeType, FunctionType, ModuleType
+from typing import Any, NamedTuple, TypeAlias, TypeVar, ParamSpec
 import textwrap
+import linecache
+from time import perf_counter
+from easy_sync import code_cache, instrumentation, precompiled
+from easy_sync.substitutions import substitution_index
 
 P = ParamSpec("P")
 R = TypeVar("R")
+AST_T = TypeVar("AST_T", bound=ast.AST)
 
 def _is_sync_compatible_decorator(decorator: ast.expr) -> bool:
     if isinstance(decorator, ast.Name) and decorator.id == 'sync_compatible':
         return True
+    # `@sync_compatible(lazy=True)` and alike, but not `@sync_compatible(sync_fn=...)`
+    if isinstance(decorator, ast.Call) and _is_sync_compatible_decorator(decorator.func) and not decorator.args:
+        return all(k.arg != 'sync_fn' for k in decorator.keywords)
     return False
 
 class FunctionTransformer(ast.NodeTransformer):
-    def __init__(self):
-        self.is_toplevel = True
-        self.need_time_import = False
-        self.parents : list[ast.AST] = []
-        self.new_nodes : set[ast.AST] = set()
-        self.visited_nodes : set[ast.AST] = set()
+    '''
+    Turns the async function into its sync version, in a single pass over the tree
 
-    def visit(self, node: ast.AST):
-        if node in self.visited_nodes:
-            return node
-        if node in self.new_nodes:
-            return node
+    The original tree is never modified: a node whose children change is replaced by a (shallow) copy, and the unchanged
+    subtrees are shared with the original tree. So a nested async function can keep its original body in the async
+    version, while its sync version is generated next to it.
+    '''
 
-        is_nesting = isinstance(node, (ast.AsyncFunctionDef, ast.FunctionDef))
-        if is_nesting:
-            self.parents.append(node)
-        result = super().visit(node)
-        if is_nesting:
-            self.parents.pop()
-        return result
+    def __init__(self, sync_names: frozenset[str] = frozenset(), substitutions: dict[str, str] | None = None, reserved_names: set[str] | None = None, is_sync_names: frozenset[str] = frozenset()):
+        self.is_toplevel = True
+        self.extras : dict[str, str] = {} # extra names needed by the generated code -> the modules they refer to
+        self.sync_names = sync_names # global names known to be sync compatible, called via `f.__sync__(x)`
+        self.substitutions = substitutions or {} # dotted names of async APIs -> sync equivalents ("module:qualname")
+        self.substituted_nodes : set[ast.expr] = set()
+        self.deferring_nodes : set[ast.expr] = set() # substituted APIs whose first argument (a call) is deferred, see `_defer_first_argument`
+        self.is_sync_names = is_sync_names # (dotted) names referring to `easy_sync.IS_SYNC`, e.g. "IS_SYNC" or "es.IS_SYNC"
+        self.folded_nodes : set[ast.expr] = set() # `easy_sync.IS_SYNC` evaluated in the sync version, see `visit_If`
+        self.reserved_names = reserved_names or set() # names used by the original code, which the extra names must avoid
+        self.scopes : list[dict[str, bool]] = [] # the names bound by the enclosing functions, see `_scope_bindings`
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        changes : dict[str, Any] = {}
+        for field, old_value in ast.iter_fields(node):
+            if isinstance(old_value, list):
+                new_values = self._visit_list(old_value)
+                if new_values is not old_value:
+                    changes[field] = new_values
+            elif isinstance(old_value, ast.AST):
+                new_value = self.visit(old_value)
+                if new_value is not old_value:
+                    changes[field] = new_value
+        if not changes:
+            return node
+        new_node = _shallow_copy(node)
+        new_node.__dict__.update(changes)
+        return new_node
+
+    def _visit_list(self, values: list[Any]) -> list[Any]:
+        ''' returns the list itself if nothing changes, a visitor can return a list of nodes to replace one statement '''
+
+        new_values : list[Any] | None = None
+        for i, value in enumerate(values):
+            new_value = self.visit(value) if isinstance(value, ast.AST) else value
+            if new_value is value and new_values is None:
+                continue
+            if new_values is None:
+                new_values = values[:i]
+            if isinstance(new_value, list):
+                new_values.extend(new_value)
+            elif new_value is not None:
+                new_values.append(new_value)
+        return values if new_values is None else new_values
 
     def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
 
-        #print(self.is_toplevel)
-        #print(node.name)
-
-        self.visited_nodes.add(node)
+        is_toplevel, self.is_toplevel = self.is_toplevel, False
+        self.scopes.append(_scope_bindings(node))
+        body = self._visit_list(node.body)
+        self.scopes.pop()
 
         # turn `async def some_func` into `def some_func__sync__`
+        new_sync_node = ast.FunctionDef( #type: ignore # type_params is set below on python 3.12+
+            name=node.name + '__sync__',
+            args=self.visit(node.args),
+            body=body,
+            decorator_list=[], #NOTE: remove decorators, as they are designed for async functions and may not be applicable to sync functions
+            returns=node.returns and self.visit(node.returns),
+            type_comment=node.type_comment,
+            lineno=node.lineno,
+            col_offset=node.col_offset,
+            end_lineno=node.end_lineno,
+            end_col_offset=node.end_col_offset,
+        )
         if sys.version_info >= (3, 12): #pragma: no cover
-            _new_sync_node = ast.FunctionDef(
-                name=node.name + '__sync__',
-                args=node.args,
-                body=node.body,
-                decorator_list=[], #NOTE: remove decorators, as they are designed for async functions and may not be applicable to sync functions
-                returns=node.returns,
-                type_comment=node.type_comment,
-                lineno=node.lineno,
-                col_offset=node.col_offset,
-                type_params = node.type_params
-            )
-        else:
-            _new_sync_node = ast.FunctionDef(
-                name=node.name + '__sync__',
-                args=node.args,
-                body=node.body,
-                decorator_list=[], #NOTE: remove decorators, as they are designed for async functions and may not be applicable to sync functions
-                returns=node.returns,
-                type_comment=node.type_comment,
-                lineno=node.lineno,
-                col_offset=node.col_offset,
-            )
-
-        if self.is_toplevel:
-            self.is_toplevel = False
-            new_sync_node = self.visit(_new_sync_node)
-            return new_sync_node
-        else:
-            #NOTE: this is for nested inner function
-
-            # turn `@sync_compatible` decorator into `@sync_compatible(sync_fn=xxx__sync__)`
-            new_decorator = ast.Call(ast.Name(id='sync_compatible', ctx=ast.Load()), [], [ast.keyword(arg='sync_fn', value=ast.Name(id=node.name + '__sync__', ctx=ast.Load()))])
-            new_decorator_list = [new_decorator if _is_sync_compatible_decorator(d) else d for d in node.decorator_list]
-
-            if sys.version_info >= (3, 12): #pragma: no cover
-                new_async_node = ast.AsyncFunctionDef(
-                    name=node.name,
-                    args=node.args,
-                    body=node.body,
-                    decorator_list=new_decorator_list,
-                    returns=node.returns,
-                    type_comment=node.type_comment,
-                    lineno=node.lineno,
-                    col_offset=node.col_offset,
-                    type_params = node.type_params
-                )
-            else:
-                new_async_node = ast.AsyncFunctionDef(
-                    name=node.name,
-                    args=node.args,
-                    body=node.body, #[self.visit(x) for x in node.body],
-                    decorator_list=new_decorator_list,
-                    returns=node.returns,
-                    type_comment=node.type_comment,
-                    lineno=node.lineno,
-                    col_offset=node.col_offset,
-                )
+            new_sync_node.type_params = node.type_params
 
-            self.new_nodes.add(new_async_node) #avoid duplicate processing
+        if is_toplevel:
+            return new_sync_node
 
-            # NOTE: insert the new async & sync function's definition into the parent function's body
-            # the return value will replace the current position, so the insertion position should be after the current position
+        #NOTE: this is for nested inner function
 
-            #print(f"parents: {[parent.name for parent in self.parents]}")
-            #print(f"current: {node.name}")
+        # turn `@sync_compatible` decorator into `@sync_compatible(sync_fn=xxx__sync__)`, the body of the async version is kept as is
+        new_decorator = ast.Call(ast.Name(id='sync_compatible', ctx=ast.Load()), [], [ast.keyword(arg='sync_fn', value=ast.Name(id=node.name + '__sync__', ctx=ast.Load()))])
+        new_async_node = _shallow_copy(node)
+        new_async_node.decorator_list = [new_decorator if _is_sync_compatible_decorator(d) else d for d in node.decorator_list]
 
-            parent : ast.AsyncFunctionDef = self.parents[-2] #type: ignore
-            print(f"current: {node.name}, parent: {parent.name}")
-            index = parent.body.index(node)
+        # both definitions replace the original one in the parent's body, the sync one comes first since the decorator refers to it
+        return [new_sync_node, new_async_node]
 
-            #print(f"inserted node: {new_async_node.name} at index: {index}")
-            parent.body.insert(index + 1, new_async_node)
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        # a sync function may rebind the names, and contain async functions itself
+        self.scopes.append(_scope_bindings(node))
+        new_node = self.generic_visit(node)
+        self.scopes.pop()
+        return new_node
 
-            new_sync_node = self.visit(_new_sync_node)
-            self.new_nodes.add(new_sync_node) #avoid duplicate processing
+    def visit_Lambda(self, node: ast.Lambda):
+        self.scopes.append(_scope_bindings(node))
+        new_node = self.generic_visit(node)
+        self.scopes.pop()
+        return new_node
 
-            return self.visit(new_sync_node)
+    def _is_nested_sync_name(self, name: str) -> bool:
+        ''' whether the name refers to a nested async function (with a `f__sync__` version) in the current scope '''
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return False
 
     def visit_Await(self, node: ast.Await):
+        node = self.generic_visit(node) #type: ignore # handle the nested awaits such as `await f(await g())`
+
         call = node.value
-        if isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'sleep' and isinstance(call.func.value, ast.Name) and call.func.value.id == 'asyncio':
-            # replace `await asyncio.sleep(1)` into `time.sleep(1)`
-            self.need_time_import = True
-            new_call = ast.Call(func=ast.Attribute(value=ast.Name(id='time', ctx=ast.Load()), attr='sleep', ctx=ast.Load()), args=call.args, keywords=call.keywords)
-            return new_call
+        if isinstance(call, ast.Call) and call.func in self.substituted_nodes:
+            # the sync equivalent returns the result directly, e.g. `await asyncio.sleep(1)` into `_easy_sync.sleep(1)`
+            if call.func in self.deferring_nodes:
+                return self._defer_first_argument(call)
+            return call
+        elif (direct_call := self._direct_sync_call(call)) is not None:
+            return direct_call
         else:
-            # replace `await f(x)` into `f(x).wait()`
-            new_call = ast.Call(func=ast.Attribute(value=call, attr='wait', ctx=ast.Load()), args=[], keywords=[])
-            return new_call
+            # replace `await f(x)` / `await obj.method(x)` into `_easy_sync.resolve(f(x))`, which waits a Waitable, runs a plain
+            # coroutine (e.g. of a callback parameter) on the background loop, and returns the result of a sync
+            # equivalent (e.g. the method of a `threading.Event`) as is
+            return ast.copy_location(ast.Call(func=self._runtime_attr('resolve'), args=[call], keywords=[]), node)
+
+    def _defer_first_argument(self, call: ast.Call) -> ast.Call:
+        ''' `_easy_sync.wait_for(f(x), t)` into `_easy_sync.wait_for(_easy_sync.DeferredCall(f, x), t)` '''
+        first = call.args[0] if call.args else None
+        if not isinstance(first, ast.Call):
+            return call
+        deferred = ast.copy_location(ast.Call(func=self._runtime_attr('DeferredCall'), args=[first.func, *first.args], keywords=first.keywords), first)
+        return ast.copy_location(ast.Call(func=call.func, args=[deferred, *call.args[1:]], keywords=call.keywords), call)
+
+    def _direct_sync_call(self, call: ast.expr) -> ast.Call | None:
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)):
+            return None
+        if self._is_nested_sync_name(call.func.id):
+            # `f(x)` into `f__sync__(x)`, when f is a nested async function
+            new_call = ast.Call(func=ast.Name(id=call.func.id + '__sync__', ctx=ast.Load()), args=call.args, keywords=call.keywords)
+            return ast.copy_location(new_call, call)
+        if call.func.id in self.sync_names:
+            # `f(x)` into `f.__sync__(x)`, when f is known to be sync compatible, this skips the Waitable
+            new_call = ast.Call(func=ast.Attribute(value=call.func, attr='__sync__', ctx=ast.Load()), args=call.args, keywords=call.keywords)
+            return ast.copy_location(new_call, call)
+        return None
+
+    def visit_AsyncFor(self, node: ast.AsyncFor):
+        node = self.generic_visit(node) #type: ignore
+
+        # replace `async for x in f(y)` into `for x in f(y)`, which iterates the sync generator
+        iter = self._direct_sync_call(node.iter) or node.iter
+        return ast.copy_location(ast.For(target=node.target, iter=iter, body=node.body, orelse=node.orelse, type_comment=node.type_comment), node)
+
+    def visit_comprehension(self, node: ast.comprehension):
+        new_node : ast.comprehension = self.generic_visit(node) #type: ignore
+
+        # replace `[x async for x in f(y)]` into `[x for x in f(y)]`
+        if new_node.is_async:
+            new_node = ast.comprehension(target=new_node.target, iter=self._direct_sync_call(new_node.iter) or new_node.iter, ifs=new_node.ifs, is_async=0)
+        return new_node
+
+    def visit_AsyncWith(self, node: ast.AsyncWith):
+        node = self.generic_visit(node) #type: ignore
+
+        # replace `async with x` into `with x`, x is expected to be substituted by a sync equivalent, e.g. `asyncio.Lock()` into `threading.Lock()`
+        return ast.copy_location(ast.With(items=node.items, body=node.body, type_comment=node.type_comment), node)
+
+    def visit_If(self, node: ast.If):
+        test = self.visit(node.test)
+
+        # keep only the branch of the sync version, e.g. `if easy_sync.IS_SYNC: <sync code> else: <async code>`,
+        # the other branch is not even visited, so that it adds no extra names
+        if self._is_folded(test):
+            return self._visit_list(node.body if test.value else node.orelse) or ast.copy_location(ast.Pass(), node)
+
+        body, orelse = self._visit_list(node.body), self._visit_list(node.orelse)
+        if test is node.test and body is node.body and orelse is node.orelse:
+            return node
+        return ast.copy_location(ast.If(test=test, body=body, orelse=orelse), node)
+
+    def visit_IfExp(self, node: ast.IfExp):
+        test = self.visit(node.test)
+        if self._is_folded(test):
+            return self.visit(node.body if test.value else node.orelse)
+
+        body, orelse = self.visit(node.body), self.visit(node.orelse)
+        if test is node.test and body is node.body and orelse is node.orelse:
+            return node
+        return ast.copy_location(ast.IfExp(test=test, body=body, orelse=orelse), node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp):
+        node = self.generic_visit(node) #type: ignore
+        if isinstance(node.op, ast.Not) and self._is_folded(node.operand):
+            return self._folded(not node.operand.value, node) #type: ignore
+        return node
+
+    def _folded(self, value: bool, node: ast.expr) -> ast.Constant:
+        ''' the value of `easy_sync.IS_SYNC` (or an expression of it) in the sync version '''
+        new_node = ast.copy_location(ast.Constant(value=value), node)
+        self.folded_nodes.add(new_node)
+        return new_node
+
+    def _is_folded(self, expr: ast.expr) -> bool:
+        return expr in self.folded_nodes
+
+    def visit_Name(self, node: ast.Name):
+        if node.id in self.is_sync_names and isinstance(node.ctx, ast.Load):
+            return self._folded(True, node)
+        if isinstance(node.ctx, ast.Load) and node.id in self.substitutions:
+            return self._substitute(node, self.substitutions[node.id])
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute):
+        dotted = _dotted_name(node)
+        if dotted is not None and dotted in self.is_sync_names and isinstance(node.ctx, ast.Load):
+            return self._folded(True, node)
+        if dotted is not None and isinstance(node.ctx, ast.Load) and dotted in self.substitutions:
+            return self._substitute(node, self.substitutions[dotted])
+        return self.generic_visit(node)
+
+    def _substitute(self, node: ast.expr, sync_spec: str) -> ast.expr:
+        module, _, qualname = sync_spec.partition(':')
+        new_node : ast.expr = ast.Name(id=self._module_alias(module), ctx=ast.Load())
+        for attr in qualname.split('.'):
+            new_node = ast.Attribute(value=new_node, attr=attr, ctx=ast.Load())
+        self.substituted_nodes.add(new_node)
+        if sync_spec in _DEFERRING_APIS:
+            self.deferring_nodes.add(new_node)
+        return ast.copy_location(new_node, node)
+
+    def _module_alias(self, module: str) -> str:
+        alias = _MODULE_ALIASES.get(module) or module.rpartition('.')[2]
+        if alias in self.reserved_names:
+            alias = '_easy_sync_' + module.replace('.', '_')
+        self.extras[alias] = module
+        return alias
+
+    def _runtime_attr(self, name: str) -> ast.expr:
+        return ast.Attribute(value=ast.Name(id=self._module_alias('easy_sync.runtime'), ctx=ast.Load()), attr=name, ctx=ast.Load())
+
+
+def _shallow_copy(node: AST_T) -> AST_T:
+    ''' much cheaper than `copy.copy`, the fields and the location attributes of an AST node live in its `__dict__` '''
+    new_node = node.__class__.__new__(node.__class__)
+    new_node.__dict__.update(node.__dict__)
+    return new_node
+
+
+def _dotted_name(expr: ast.expr) -> str | None:
+    ''' `a.b.c` -> "a.b.c", or None if expr is not a dotted name '''
+    if isinstance(expr, ast.Name):
+        return expr.id
+    if isinstance(expr, ast.Attribute):
+        value = _dotted_name(expr.value)
+        return None if value is None else f"{value}.{expr.attr}"
+    return None
+
+
+def _used_names(tree: ast.AST) -> set[str]:
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def _bound_names(tree: ast.AST) -> set[str]:
+    ''' all the names bound somewhere inside the tree, they might shadow the global ones '''
+    names : set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split('.')[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+def _scope_bindings(node: ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda) -> dict[str, bool]:
+    '''
+    the names bound in the scope of a function (not in the nested ones), mapped to whether the name is only bound by
+    nested `@sync_compatible` (or undecorated) async functions, i.e. whether `f(x)` can be called as `f__sync__(x)`
+    '''
+
+    bindings : dict[str, bool] = {}
+    args = node.args
+    for arg in [*args.posonlyargs, *args.args, *args.kwonlyargs, args.vararg, args.kwarg]:
+        if arg is not None:
+            bindings[arg.arg] = False
+
+    stack : list[ast.AST] = [node.body] if isinstance(node, ast.Lambda) else list(node.body)
+    while stack:
+        child = stack.pop()
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            is_sync = isinstance(child, ast.AsyncFunctionDef) and all(_is_sync_compatible_decorator(d) for d in child.decorator_list)
+            bindings[child.name] = bindings.get(child.name, True) and is_sync
+            # only the decorators, the defaults and the bases are evaluated in this scope
+            stack.extend(child.decorator_list)
+            if isinstance(child, ast.ClassDef):
+                stack.extend(child.bases)
+                stack.extend(child.keywords)
+            else:
+                stack.extend(child.args.defaults)
+                stack.extend(d for d in child.args.kw_defaults if d is not None)
+            continue
+        if isinstance(child, ast.Lambda):
+            stack.extend(child.args.defaults)
+            stack.extend(d for d in child.args.kw_defaults if d is not None)
+            continue
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            bindings[child.id] = False
+        elif isinstance(child, ast.alias):
+            bindings[(child.asname or child.name).split('.')[0]] = False
+        elif isinstance(child, ast.ExceptHandler) and child.name:
+            bindings[child.name] = False
+        elif isinstance(child, (ast.Global, ast.Nonlocal)):
+            bindings.update((name, False) for name in child.names)
+        elif isinstance(child, (ast.MatchAs, ast.MatchStar)) and child.name:
+            bindings[child.name] = False
+        elif isinstance(child, ast.MatchMapping) and child.rest:
+            bindings[child.rest] = False
+        stack.extend(ast.iter_child_nodes(child))
+    return bindings
+
+
+_FACTORY_NAME = '__easy_sync_factory__'
+
+# the sync APIs which take their first argument as a `DeferredCall`, so that the call is made after the deadline is set
+_DEFERRING_APIS = frozenset(['easy_sync.runtime:wait_for'])
+
+# the names which the generated code uses to refer the modules, by default the last component of the module name
+_MODULE_ALIASES : dict[str, str] = {'easy_sync.runtime': '_easy_sync'}
+
+
+class TransformContext(NamedTuple):
+    ''' everything besides the source code which affects the generated code '''
+
+    sync_names : frozenset[str] # global names which are sync compatible functions
+    substitutions : frozenset[tuple[str, str]] # (dotted name of an async API, sync equivalent)
+    is_sync_names : frozenset[str] = frozenset() # (dotted) global names referring to `easy_sync.IS_SYNC`
+
+    def cache_key(self) -> str:
+        return ';'.join([','.join(sorted(self.sync_names)), ','.join(f"{a}={s}" for a, s in sorted(self.substitutions)), ','.join(sorted(self.is_sync_names))])
+
+
+# (async code object, context) -> (sync code object, (extra name, module) pairs needed by the sync code)
+SyncCodeEntry : TypeAlias = tuple[CodeType, tuple[tuple[str, str], ...]]
+_sync_code_memo : dict[tuple[CodeType, TransformContext], SyncCodeEntry] = {}
+
+# async code object -> global names it refers to
+_global_names_memo : dict[CodeType, frozenset[str]] = {}
+
+# (async code object, module name, substitution registry version) -> substitutions
+_substitutions_memo : dict[tuple[CodeType, str, tuple[int, int]], frozenset[tuple[str, str]]] = {}
 
 
 def transform_function_to_sync(func: Callable[P, Awaitable[R]]) -> Callable[P, R]:
+    start = perf_counter()
+    sync_decorators = _sync_decorators(func)
+    func = inspect.unwrap(func)
+    async_code = func.__code__
+    context = _transform_context(func)
+
+    entry = _sync_code_memo.get((async_code, context))
+    if entry is None:
+        #NOTE: no lock is held while transforming, which may import modules, threads racing here do the work twice,
+        # but `setdefault` is atomic (with or without the GIL), so that they all end up with the first published entry
+        entry = _sync_code_memo.setdefault((async_code, context), _load_sync_code(func, context))
+
+    sync_func = _make_sync_function(entry, func)
+    for decorator in reversed(sync_decorators): # the innermost first, as the async decorators were applied
+        sync_func = decorator(sync_func)
+    if instrumentation._hooks:
+        instrumentation.record_transform(func, perf_counter() - start)
+    return sync_func
+
+
+def _sync_decorators(func: Callable[..., Any]) -> list[Callable[[Callable[..., Any]], Callable[..., Any]]]:
+    '''
+    the sync halves of the dual-mode decorators (see `easy_sync.decorators`) along the `__wrapped__` chain, the outermost first
+
+    The decorators are removed from the generated sync code, a decorator which provides `__sync_decorator__` on its
+    async wrapper is applied to the sync function again.
+    '''
+
+    decorators : list[Callable[[Callable[..., Any]], Callable[..., Any]]] = []
+    seen : set[int] = {id(func)}
+    while True:
+        decorator = getattr(func, '__sync_decorator__', None)
+        #NOTE: `functools.wraps` copies the attribute to the outer wrappers, so it might be found several times
+        if decorator is not None and all(d is not decorator for d in decorators):
+            decorators.append(decorator)
+        func = getattr(func, '__wrapped__', None) #type: ignore
+        if func is None or id(func) in seen:
+            return decorators
+        seen.add(id(func))
+
+
+def _transform_context(func: Callable[..., Any]) -> TransformContext:
+    code = func.__code__
+    names = _global_names_memo.get(code)
+    if names is None:
+        names = _global_names_memo[code] = frozenset(_code_names(code))
+
+    func_globals = func.__globals__
+    # NOTE: the function itself is not bound yet (or bound to a stale version) while decorating, so it's excluded
+    sync_names = frozenset(n for n in names if n != func.__name__ and hasattr(func_globals.get(n), '__sync__'))
+
+    version, index = substitution_index()
+    substitutions = _substitutions_memo.get((code, func.__module__, version))
+    if substitutions is None:
+        substitutions = _substitutions_memo[(code, func.__module__, version)] = _find_substitutions(names, func_globals, index)
+
+    return TransformContext(sync_names, substitutions, _find_is_sync_names(names, func_globals))
+
+
+def _find_is_sync_names(names: frozenset[str], func_globals: dict[str, Any]) -> frozenset[str]:
+    '''
+    find the names referring to `easy_sync.IS_SYNC`: `IS_SYNC` imported from easy_sync, or `module.IS_SYNC` where
+    module is easy_sync under any name (e.g. `import easy_sync as es`)
+    '''
+
+    if 'IS_SYNC' not in names:
+        return frozenset()
+    easy_sync = sys.modules.get('easy_sync')
+    #NOTE: `IS_SYNC` is a plain False, so a global named IS_SYNC is trusted to be the imported one
+    found = {'IS_SYNC'} if 'IS_SYNC' in func_globals and func_globals['IS_SYNC'] is getattr(easy_sync, 'IS_SYNC', None) else set()
+    found.update(f"{name}.IS_SYNC" for name in names if easy_sync is not None and func_globals.get(name) is easy_sync)
+    return frozenset(found)
+
+
+def _find_substitutions(names: frozenset[str], func_globals: dict[str, Any], index: dict[int, tuple[Any, str]]) -> frozenset[tuple[str, str]]:
+    ''' find the registered async APIs referred as `name` or `module.name` '''
+
+    def lookup(obj: Any) -> str | None:
+        hit = index.get(id(obj))
+        return hit[1] if hit is not None and hit[0] is obj else None
+
+    builtins_dict : dict[str, Any] = func_globals.get('__builtins__', builtins.__dict__)
+    if isinstance(builtins_dict, ModuleType):
+        builtins_dict = builtins_dict.__dict__ #pragma: no cover
+
+    found : set[tuple[str, str]] = set()
+    for name in names:
+        obj = func_globals[name] if name in func_globals else builtins_dict.get(name)
+        if obj is None:
+            continue
+        if (sync_spec := lookup(obj)) is not None:
+            found.add((name, sync_spec))
+        elif isinstance(obj, ModuleType):
+            for attr in names:
+                if (sync_spec := lookup(getattr(obj, attr, None))) is not None:
+                    found.add((f"{name}.{attr}", sync_spec))
+    return frozenset(found)
+
+
+def _code_names(code: CodeType) -> Iterator[str]:
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _code_names(const)
+
+
+def _make_sync_function(entry: SyncCodeEntry, func: Callable[..., Any]) -> Callable[..., Any]:
+    ''' build the sync function from the (cached) sync code, reusing the globals, closure cells and defaults of func '''
+
+    sync_code, extras = entry
+
+    cells : dict[str, CellType] = {}
+    if func.__closure__:
+        cells = dict(zip(func.__code__.co_freevars, func.__closure__))
+    for name, module in extras:
+        cells[name] = CellType(importlib.import_module(module))
+
+    closure = tuple(cells[name] for name in sync_code.co_freevars)
+    new_func = FunctionType(sync_code, func.__globals__, sync_code.co_name, func.__defaults__, closure or None)
+    new_func.__kwdefaults__ = func.__kwdefaults__
+    new_func.__qualname__ = func.__qualname__ + '__sync__'
+    return new_func
+
+
+def _get_source(func: Callable[..., Any]) -> str:
     source_code = inspect.getsource(func)
 
     # remove leading whitespace to ensure consistent indentation
-    source_code = textwrap.dedent(source_code)
+    return textwrap.dedent(source_code)
+
+
+def _load_sync_code(func: Callable[..., Any], context: TransformContext) -> SyncCodeEntry:
+    # the entries generated ahead of time by `python -m easy_sync.compile`, which need no source code
+    entry = precompiled.lookup(func, context.cache_key())
+    if entry is None:
+        entry = _load_cached_sync_code(func, context)
+    return entry
+
+
+def _load_cached_sync_code(func: Callable[..., Any], context: TransformContext) -> SyncCodeEntry:
+    source_code = _get_source(func)
+
+    filename = func.__code__.co_filename
+    qualname = func.__qualname__
+    firstlineno = func.__code__.co_firstlineno
+    # the line numbers are baked into the code object, so a function moved within its file needs a new entry
+    cache_context = f"{context.cache_key()}@{firstlineno}"
+
+    cached = code_cache.load(filename, qualname, source_code, cache_context)
+    if cached is not None:
+        return cached
+
+    entry = _compile_sync_code(source_code, func.__name__, func.__code__.co_freevars, context, filename, firstlineno)
+    code_cache.store(filename, qualname, source_code, entry, cache_context)
+    return entry
+
+
+def _transform_tree(source_code: str, freevars: tuple[str, ...], context: TransformContext, firstlineno: int = 1) -> tuple[ast.Module, tuple[tuple[str, str], ...]]:
+    ''' returns the transformed module (the sync function and the nested definitions) and the extra names it needs '''
 
     tree = ast.parse(source_code)
+    # keep the line numbers of the original file, so that tracebacks and profilers point to the real source lines
+    ast.increment_lineno(tree, firstlineno - 1)
 
     #print("tree", ast.dump(tree, indent=2))
 
-    transformer = FunctionTransformer()
+    bound_names = _bound_names(tree)
+    transformer = FunctionTransformer(
+        sync_names=frozenset(context.sync_names - bound_names),
+        substitutions={a: s for a, s in context.substitutions if a.split('.')[0] not in bound_names},
+        reserved_names=bound_names | _used_names(tree) | set(freevars),
+        is_sync_names=frozenset(n for n in context.is_sync_names if n.split('.')[0] not in bound_names),
+    )
 
     new_tree = transformer.visit(tree)
+    return new_tree, tuple(sorted(transformer.extras.items()))
 
-    # NOTE: not working
-    # if transformer.need_time_import:
-    #     import_time_stmt = ast.Import(names=[ast.alias(name='time', asname=None)])
-    #     new_tree.body.insert(0, import_time_stmt)
 
-    new_source_code = ast.unparse(new_tree)
+def _compile_sync_code(source_code: str, name: str, freevars: tuple[str, ...], context: TransformContext = TransformContext(frozenset(), frozenset()), filename: str = "<ast>", firstlineno: int = 1) -> SyncCodeEntry:
+    '''
+    the AST pipeline, returns the compiled sync code and the extra names it needs
 
-    #print("new_tree", ast.dump(new_tree, indent=2))
+    The generated function is wrapped into a factory function whose parameters are the free variables
+    of the original function, so that the sync code object can reuse the closure cells of the original one.
+    The AST is compiled directly with the original filename and line numbers, no source code is generated.
+    '''
 
-    #print("[NEW_SOURCE_CODE]:")
-    #print(new_source_code)
+    new_tree, extras = _transform_tree(source_code, freevars, context, firstlineno)
+    sync_name = name + '__sync__'
 
-    try:
-        # compile the new source code
-        code = compile(new_source_code, filename="<ast>", mode="exec")
-    except Exception as e: #pragma: no cover
-        print("[Transformed Code]:")
-        print(new_source_code)
-        raise Exception("[transform_function_to_sync()]: failed to compile code", {"code": new_source_code}) from e
+    factory = _make_function_def(
+        name=_FACTORY_NAME,
+        params=[*freevars, *(name for name, _ in extras)],
+        body=[*new_tree.body, ast.Return(value=ast.Name(id=sync_name, ctx=ast.Load()))],
+    )
+    ast.copy_location(factory, new_tree.body[0])
+    new_tree = _fix_missing_locations(ast.Module(body=[factory], type_ignores=[]))
+
+    #print("new_tree", ast.dump(new_tree, indent=2))
 
-    # prepare for exec
-    local_vars : dict[str, Any] = {}
-    globals : dict[str, Any]
+    code = _compile_tree(new_tree, filename, 'transform_function_to_sync')
+
+    factory_code = _find_code(code, _FACTORY_NAME)
+    return _find_code(factory_code, sync_name), extras
+
+
+def _transform_function_def(node: ast.AsyncFunctionDef, context: TransformContext, reserved_names: set[str]) -> tuple[list[ast.stmt], dict[str, str]]:
+    ''' transform a single async def taken from a larger tree, returns the new statements and the extra names they need '''
+
+    bound_names = _bound_names(node)
+    transformer = FunctionTransformer(
+        sync_names=frozenset(context.sync_names - bound_names),
+        substitutions={a: s for a, s in context.substitutions if a.split('.')[0] not in bound_names},
+        reserved_names=reserved_names,
+        is_sync_names=frozenset(n for n in context.is_sync_names if n.split('.')[0] not in bound_names),
+    )
+    new_tree = transformer.visit(ast.Module(body=[node], type_ignores=[]))
+    return new_tree.body, transformer.extras
+
+
+def prepare_module(module: ModuleType) -> int:
+    '''
+    transform the pending sync compatible functions defined in a module in one pass, returns the number of functions transformed
+
+    The module source is read and parsed once, and all the sync functions are compiled into one code object. The entries
+    are put into the memo, so that the following `transform_function_to_sync` calls for these functions are cheap.
+    The closures (e.g. `add_1 = make_adder(1)` at the module level) are skipped.
+    '''
+
+    pending : dict[str, tuple[Callable[..., Any], TransformContext]] = {}
+    for obj in list(vars(module).values()):
+        if not callable(getattr(obj, '_resolve_sync_fn', None)):
+            continue
+        func = inspect.unwrap(obj)
+        if not inspect.isfunction(func) or func.__module__ != module.__name__ or func.__name__ in pending:
+            continue
+        if func.__code__.co_freevars:
+            #NOTE: closures are left to `transform_function_to_sync`, which binds the cells of each closure, while the
+            # shared factory here could not: the free variables of a function may shadow the globals used by another
+            continue
+        context = _transform_context(func)
+        if (func.__code__, context) in _sync_code_memo:
+            continue
+        entry = precompiled.lookup(func, context.cache_key())
+        if entry is not None:
+            _sync_code_memo.setdefault((func.__code__, context), entry)
+            continue
+        pending[func.__name__] = (func, context)
+
+    filename : str | None = getattr(module, '__file__', None)
+    lines = linecache.getlines(filename, module.__dict__) if filename else []
+    if not pending or not filename or not lines:
+        return 0 # nothing to do, or no source available (the functions are left to `transform_function_to_sync`)
+
+    tree = ast.parse(''.join(lines))
+    # the async defs by (first line including the decorators, name), which is what `co_firstlineno` refers to
+    async_defs = {
+        (node.decorator_list[0].lineno if node.decorator_list else node.lineno, node.name): node
+        for node in ast.walk(tree) if isinstance(node, ast.AsyncFunctionDef)
+    }
+    reserved_names = _bound_names(tree) | _used_names(tree)
+
+    extras : dict[str, str] = {}
+    body : list[ast.stmt] = []
+    compiled : list[tuple[Callable[..., Any], TransformContext, str, str]] = []
+    for func, context in pending.values():
+        node = async_defs.get((func.__code__.co_firstlineno, func.__name__))
+        if node is None or func.__code__.co_filename != filename:
+            continue
+        firstlineno = func.__code__.co_firstlineno
+        source_code = textwrap.dedent(''.join(lines[firstlineno - 1 : node.end_lineno]))
+        cache_context = f"{context.cache_key()}@{firstlineno}"
+        cached = code_cache.load(filename, func.__qualname__, source_code, cache_context)
+        if cached is not None:
+            _sync_code_memo.setdefault((func.__code__, context), cached)
+            continue
+        new_body, new_extras = _transform_function_def(node, context, reserved_names)
+        body.extend(new_body)
+        extras.update(new_extras)
+        compiled.append((func, context, source_code, cache_context))
+
+    if not compiled:
+        return 0
+
+    sorted_extras = tuple(sorted(extras.items()))
+    factory = _make_function_def(name=_FACTORY_NAME, params=[alias for alias, _ in sorted_extras], body=body)
+    ast.copy_location(factory, body[0])
+    new_tree = _fix_missing_locations(ast.Module(body=[factory], type_ignores=[]))
+
+    code = _compile_tree(new_tree, filename, 'prepare_module')
+
+    factory_code = _find_code(code, _FACTORY_NAME)
+    for func, context, source_code, cache_context in compiled:
+        entry = (_find_code(factory_code, func.__name__ + '__sync__'), sorted_extras)
+        _sync_code_memo.setdefault((func.__code__, context), entry)
+        code_cache.store(filename, func.__qualname__, source_code, entry, cache_context)
+    return len(compiled)
+
+
+def transform_class_to_sync(cls: type, methods: dict[str, Callable[..., Any]]) -> dict[str, Callable[..., Any]]:
+    '''
+    transform the async methods of a class in one pass, returns the sync versions by method name
+
+    The class source is parsed once and all the sync methods are compiled into one code object, inside a class
+    of the same name, so that the private names are mangled and `super()` works as in the original methods.
+    '''
+
+    start = perf_counter()
+    funcs = {name: inspect.unwrap(fn) for name, fn in methods.items()}
+    contexts = [_transform_context(fn) for fn in funcs.values()]
+    context = TransformContext(
+        frozenset().union(*(c.sync_names for c in contexts)),
+        frozenset().union(*(c.substitutions for c in contexts)),
+        frozenset().union(*(c.is_sync_names for c in contexts)),
+    )
+
+    entries : dict[str, SyncCodeEntry] = {}
+    for name, fn in funcs.items():
+        entry = _sync_code_memo.get((fn.__code__, context)) or precompiled.lookup(fn, context.cache_key())
+        if entry is not None:
+            entries[name] = entry
+
+    missing = {name: fn for name, fn in funcs.items() if name not in entries}
+    if missing:
+        entries.update(_load_sync_class_code(cls, missing, context))
+
+    sync_funcs : dict[str, Callable[..., Any]] = {}
+    for name, fn in funcs.items():
+        entry = _sync_code_memo.setdefault((fn.__code__, context), entries[name])
+        sync_func = _make_sync_function(entry, fn)
+        for decorator in reversed(_sync_decorators(methods[name])): # the innermost first, as the async decorators were applied
+            sync_func = decorator(sync_func)
+        sync_funcs[name] = sync_func
+
+    if instrumentation._hooks and funcs:
+        elapsed = (perf_counter() - start) / len(funcs) # the cost is shared by all the methods
+        for fn in funcs.values():
+            instrumentation.record_transform(fn, elapsed)
+    return sync_funcs
+
+
+def _load_sync_class_code(cls: type, funcs: dict[str, Callable[..., Any]], context: TransformContext) -> dict[str, SyncCodeEntry]:
+    lines, firstlineno = inspect.getsourcelines(cls)
+    source_code = textwrap.dedent(''.join(lines))
+
+    names = tuple(sorted(funcs))
+    filename = funcs[names[0]].__code__.co_filename
+    cache_context = f"{context.cache_key()}@{firstlineno}:{','.join(names)}"
+
+    cached = code_cache.load(filename, cls.__qualname__, source_code, cache_context)
+    if cached is None:
+        cached = _compile_sync_class_code(source_code, cls.__name__, funcs, context, filename, firstlineno)
+        code_cache.store(filename, cls.__qualname__, source_code, cached, cache_context)
+
+    codes, extras = cached
+    return {name: (code, extras) for name, code in zip(names, codes)}
+
+
+def _compile_sync_class_code(source_code: str, class_name: str, funcs: dict[str, Callable[..., Any]], context: TransformContext, filename: str = "<ast>", firstlineno: int = 1) -> tuple[tuple[CodeType, ...], tuple[tuple[str, str], ...]]:
+    ''' the AST pipeline of a class, returns the compiled sync methods (in the order of their names) and the extra names they need '''
 
-    if transformer.need_time_import:
-        import time
-        globals = {"time": time} | func.__globals__
+    tree = ast.parse(source_code)
+    ast.increment_lineno(tree, firstlineno - 1)
+    class_def = tree.body[0]
+    assert isinstance(class_def, ast.ClassDef)
+
+    # `__class__` is provided by the class wrapping the sync methods, the other free variables by the factory
+    freevars = sorted(set().union(*(fn.__code__.co_freevars for fn in funcs.values())) - {'__class__'})
+    reserved_names = _bound_names(class_def) | _used_names(class_def) | set(freevars)
+
+    # the last definition wins, as in the class body
+    method_defs = {node.name: node for node in class_def.body if isinstance(node, ast.AsyncFunctionDef) and node.name in funcs}
+
+    names = sorted(funcs)
+    extras : dict[str, str] = {}
+    body : list[ast.stmt] = []
+    for name in names:
+        new_body, new_extras = _transform_function_def(method_defs[name], context, reserved_names)
+        body.extend(new_body)
+        extras.update(new_extras)
+
+    if sys.version_info >= (3, 12): #pragma: no cover
+        sync_class_def = ast.ClassDef(name=class_name, bases=[], keywords=[], body=body, decorator_list=[], type_params=[])
     else:
-        globals = func.__globals__
+        sync_class_def = ast.ClassDef(name=class_name, bases=[], keywords=[], body=body, decorator_list=[])
+    ast.copy_location(sync_class_def, class_def)
+
+    sorted_extras = tuple(sorted(extras.items()))
+    factory = _make_function_def(name=_FACTORY_NAME, params=[*freevars, *(alias for alias, _ in sorted_extras)], body=[sync_class_def])
+    ast.copy_location(factory, class_def)
+    new_tree = _fix_missing_locations(ast.Module(body=[factory], type_ignores=[]))
+
+    code = _compile_tree(new_tree, filename, 'transform_class_to_sync')
 
+    class_code = _find_code(_find_code(code, _FACTORY_NAME), class_name)
+    return tuple(_find_code(class_code, name + '__sync__') for name in names), sorted_extras
+
+
+def explain(func: Callable[..., Any]) -> str:
+    '''
+    returns the generated source code of the sync version of an async function (or a sync compatible wrapper)
+
+    The extra names used by the generated code are shown as imports, they are bound via closure in fact.
+    '''
+
+    func = inspect.unwrap(func)
+    new_tree, extras = _transform_tree(_get_source(func), func.__code__.co_freevars, _transform_context(func))
+    imports = [ast.unparse(_import_stmt(alias, module)) for alias, module in extras]
+    return "".join(line + "\n" for line in imports) + ("\n\n" if imports else "") + ast.unparse(new_tree)
+
+
+def _import_stmt(alias: str, module: str) -> ast.stmt:
+    package, _, name = module.rpartition('.')
+    as_name = alias if alias != name else None
+    if package:
+        return ast.ImportFrom(module=package, names=[ast.alias(name=name, asname=as_name)], level=0)
+    return ast.Import(names=[ast.alias(name=module, asname=as_name)])
+
+
+def _compile_tree(tree: ast.Module, filename: str, caller: str) -> CodeType:
+    ''' compile the generated tree, the generated source code is printed if it fails '''
     try:
-        exec(code, globals, local_vars)
+        return compile(tree, filename=filename, mode="exec")
     except Exception as e: #pragma: no cover
+        new_source_code = ast.unparse(tree)
         print("[Transformed Code]:")
         print(new_source_code)
-        raise Exception("[transform_function_to_sync()]: failed to exec code", {"code": new_source_code}) from e
+        raise Exception(f"[{caller}()]: failed to compile code", {"code": new_source_code}) from e
 
-    new_func = local_vars[func.__name__ + '__sync__']
 
-    return new_func
+def _find_code(code: CodeType, name: str) -> CodeType:
+    for const in code.co_consts:
+        if isinstance(const, CodeType) and const.co_name == name:
+            return const
+    raise LookupError(f"[transform_function_to_sync()]: code object {name!r} not found") #pragma: no cover
+
+
+def _make_function_def(name: str, params: list[str], body: list[ast.stmt]) -> ast.FunctionDef:
+    arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=p) for p in params], kwonlyargs=[], kw_defaults=[], defaults=[])
+    if sys.version_info >= (3, 12): #pragma: no cover
+        return ast.FunctionDef(name=name, args=arguments, body=body, decorator_list=[], returns=None, type_params=[])
+    else:
+        return ast.FunctionDef(name=name, args=arguments, body=body, decorator_list=[], returns=None)
+
+
+def _fix_missing_locations(tree: ast.Module) -> ast.Module:
+    '''
+    same as `ast.fix_missing_locations`, but each node is visited once
+
+    The generated tree shares the unchanged subtrees with the original one (e.g. the bodies of the nested async functions),
+    `ast.fix_missing_locations` walks a shared subtree again for every reference to it.
+    '''
+
+    seen : set[int] = set()
+    stack : list[tuple[ast.AST, int, int, int, int]] = [(tree, 1, 0, 1, 0)]
+    while stack:
+        node, lineno, col_offset, end_lineno, end_col_offset = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if 'lineno' in node._attributes:
+            if not hasattr(node, 'lineno'):
+                node.lineno = lineno #type: ignore
+            else:
+                lineno = node.lineno #type: ignore
+        if 'end_lineno' in node._attributes:
+            if getattr(node, 'end_lineno', None) is None:
+                node.end_lineno = end_lineno #type: ignore
+            else:
+                end_lineno = node.end_lineno #type: ignore
+        if 'col_offset' in node._attributes:
+            if not hasattr(node, 'col_offset'):
+                node.col_offset = col_offset #type: ignore
+            else:
+                col_offset = node.col_offset #type: ignore
+        if 'end_col_offset' in node._attributes:
+            if getattr(node, 'end_col_offset', None) is None:
+                node.end_col_offset = end_col_offset #type: ignore
+            else:
+                end_col_offset = node.end_col_offset #type: ignore
+        for child in ast.iter_child_nodes(node):
+            stack.append((child, lineno, col_offset, end_lineno, end_col_offset))
+    return tree
 
 
 if __name__ == '__main__': # pragma: no cover
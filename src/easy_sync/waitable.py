@@ -0,0 +1,265 @@
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Coroutine, Generator, Iterable, Iterator
+from typing import Any, TypeAlias, TypeVar
+from easy_sync import deadline
+
+R = TypeVar("R")
+Y = TypeVar("Y")
+
+Thunk : TypeAlias = Callable[[], R]
+
+_NO_KWARGS : dict[str, Any] = {}
+
+class Waitable(Coroutine[Any, Any, R]):
+    '''
+    A class to represent the result of an async operation
+
+    It simply holds the function pair and the arguments, nothing is executed until it is awaited or waited.
+    The thunk style `Waitable(async_thunk=..., sync_thunk=...)` is still supported, since args default to empty,
+    the "thunks" are called with the arguments otherwise.
+
+    It also implements the coroutine protocol, so that it can be passed to `asyncio.create_task()` / `asyncio.run()` directly.
+    '''
+
+    __slots__ = ('_async_fn', '_sync_fn', '_args', '_kwargs', '_coro')
+
+    def __init__(self, async_thunk: Callable[..., Awaitable[R]], sync_thunk: Callable[..., R], args: tuple[Any, ...] = (), kwargs: dict[str, Any] = _NO_KWARGS):
+        self._async_fn = async_thunk
+        self._sync_fn = sync_thunk
+        self._args = args
+        self._kwargs = kwargs
+        #NOTE: `_coro` is left unset until the first `send()`, to keep the construction cheap
+
+    def __await__(self):
+        return self._async_fn(*self._args, **self._kwargs).__await__()
+
+    def wait(self, timeout: float | None = None) -> R:
+        '''
+        sync wait for the result, raises `TimeoutError` if it takes more than `timeout` seconds
+
+        The timeout becomes the deadline of the nested calls, see `easy_sync.deadline`.
+        '''
+        if timeout is None:
+            deadline.check()
+            return self._sync_fn(*self._args, **self._kwargs)
+        with deadline.timeout(timeout):
+            return self._sync_fn(*self._args, **self._kwargs)
+
+    def _started_coro(self) -> Generator[Any, Any, R]:
+        try:
+            return self._coro
+        except AttributeError:
+            self._coro : Generator[Any, Any, R] = self.__await__()
+            return self._coro
+
+    def send(self, value: Any) -> Any:
+        return self._started_coro().send(value)
+
+    def throw(self, typ: Any, val: Any = None, tb: Any = None) -> Any: #type: ignore
+        if val is None and tb is None:
+            return self._started_coro().throw(typ)
+        return self._started_coro().throw(typ, val, tb) #pragma: no cover
+
+    def close(self) -> None:
+        try:
+            coro = self._coro
+        except AttributeError:
+            return
+        coro.close()
+
+    def shared(self) -> 'SharedWaitable[R]':
+        ''' a Waitable which runs the operation at most once, all the awaits and waits get the same result or exception '''
+        return SharedWaitable(self._async_fn, self._sync_fn, self._args, self._kwargs)
+
+    def start(self) -> 'StartedWaitable[R]':
+        '''
+        start running the operation in background right now, await or wait the returned Waitable for the result later
+
+        With a running event loop in this thread, the coroutine is scheduled as a task on it, otherwise the sync version
+        is submitted to the executor of `easy_sync.runtime` (see `easy_sync.runtime.set_executor`).
+        '''
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            from easy_sync import runtime # circular import
+            #NOTE: the sync version is submitted rather than `self.wait`, so that the hooks of `easy_sync.instrumentation`
+            # observe the call once, when the returned Waitable is waited
+            return StartedWaitable(self, runtime._submit_call(self._sync_fn, *self._args, **self._kwargs))
+
+        future : Future[R] = Future()
+        future.set_running_or_notify_cancel()
+        started = StartedWaitable(self, future)
+        started._task = loop.create_task(started._run_async())
+        started._task.add_done_callback(lambda t: _copy_task_state(t, future))
+        return started
+
+
+def _copy_task_state(task: 'asyncio.Task[R]', future: Future[R]) -> None:
+    if future.done():
+        return # the task was cancelled before it started, and the sync version was run instead, see `StartedWaitable.wait`
+    if task.cancelled():
+        future.set_exception(asyncio.CancelledError())
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+class StartedWaitable(Waitable[R]):
+    '''
+    A Waitable whose operation is already running, see `Waitable.start()`
+
+    Awaiting it again or waiting it from several threads gets the same result, the operation is not repeated.
+    '''
+
+    __slots__ = ('_future', '_task', '_running')
+
+    def __init__(self, waitable: Waitable[R], future: Future[R], task: 'asyncio.Task[R] | None' = None):
+        super().__init__(waitable._async_fn, waitable._sync_fn, waitable._args, waitable._kwargs)
+        self._future = future
+        self._task = task
+        self._running = False
+
+    async def _run_async(self) -> R:
+        self._running = True
+        return await self._async_fn(*self._args, **self._kwargs)
+
+    def start(self) -> 'StartedWaitable[R]':
+        return self
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def wait(self, timeout: float | None = None) -> R:
+        task = self._task
+        if task is not None and not self._future.done() and _running_loop() is task.get_loop():
+            # waiting for a task of the event loop of this thread would deadlock, e.g. the generated sync code running
+            # on the loop thread waits for a call it started itself
+            task.cancel()
+            if self._running:
+                raise RuntimeError("[StartedWaitable]: the task was running on the event loop of this thread, waiting for it here would deadlock, await it instead (the task is cancelled)")
+            #NOTE: the task has not started yet, so the sync version runs in its place, with no side effect done twice
+            return self._wait_inline(timeout)
+        with deadline.timeout(timeout):
+            return _future_result(self._future)
+
+    def _wait_inline(self, timeout: float | None) -> R:
+        try:
+            result = super().wait(timeout)
+        except BaseException as e:
+            self._future.set_exception(e)
+            raise
+        self._future.set_result(result)
+        return result
+
+    def __await__(self):
+        task = self._task
+        if task is not None and not self._future.done() and _running_loop() is task.get_loop():
+            return task.__await__()
+        return asyncio.wrap_future(self._future).__await__()
+
+
+def _future_result(future: Future[R]) -> R:
+    ''' the result of the future, waiting for it until the current deadline '''
+    try:
+        return future.result(deadline.remaining())
+    except FutureTimeoutError:
+        if future.done():
+            raise # the operation itself raised it
+        #NOTE: `concurrent.futures.TimeoutError` is an alias of the builtin one since python 3.11 only
+        raise deadline.DeadlineExceeded("[easy_sync]: the deadline of the sync call has passed") from None
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SharedWaitable(Waitable[R]):
+    '''
+    A Waitable which can be handed to several consumers, see `Waitable.shared()`
+
+    The first await or wait runs the operation, the others (from any thread or task) wait for its result.
+    '''
+
+    __slots__ = ('_lock', '_future', '_owner_thread', '_owner_blocking')
+
+    def __init__(self, async_thunk: Callable[..., Awaitable[R]], sync_thunk: Callable[..., R], args: tuple[Any, ...] = (), kwargs: dict[str, Any] = _NO_KWARGS):
+        super().__init__(async_thunk, sync_thunk, args, kwargs)
+        self._lock = threading.Lock()
+        self._future : Future[R] | None = None
+
+    def shared(self) -> 'SharedWaitable[R]':
+        return self
+
+    def _claim(self, blocking: bool) -> tuple[Future[R], bool]:
+        ''' returns (the shared future, whether the caller runs the operation) '''
+        with self._lock:
+            if self._future is not None:
+                return self._future, False
+            self._future = Future()
+            self._owner_thread = threading.get_ident()
+            self._owner_blocking = blocking
+            return self._future, True
+
+    def _check_deadlock(self, future: Future[R], blocking: bool) -> None:
+        if not future.done() and self._owner_thread == threading.get_ident() and (blocking or self._owner_blocking):
+            raise RuntimeError("[SharedWaitable]: the operation is running on this thread, waiting for it here would deadlock")
+
+    def wait(self, timeout: float | None = None) -> R:
+        with deadline.timeout(timeout):
+            future, owner = self._claim(blocking=True)
+            if not owner:
+                self._check_deadlock(future, blocking=True)
+                return _future_result(future)
+            try:
+                value = self._sync_fn(*self._args, **self._kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            future.set_result(value)
+            return value
+
+    def __await__(self):
+        return self._await_shared().__await__()
+
+    async def _await_shared(self) -> R:
+        future, owner = self._claim(blocking=False)
+        if not owner:
+            self._check_deadlock(future, blocking=False)
+            #NOTE: shielded, so that a cancelled consumer doesn't cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            value = await self._async_fn(*self._args, **self._kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(value)
+        return value
+
+
+class WaitableGenerator(AsyncIterable[Y], Iterable[Y]):
+    '''
+    The result of calling a sync compatible async generator function
+
+    Iterate it via `async for` in async context, or via plain `for` in sync context, the items are streamed in both cases.
+    '''
+
+    __slots__ = ('_async_fn', '_sync_fn', '_args', '_kwargs')
+
+    def __init__(self, async_fn: Callable[..., AsyncIterator[Y]], sync_fn: Callable[..., Iterator[Y]], args: tuple[Any, ...] = (), kwargs: dict[str, Any] = _NO_KWARGS):
+        self._async_fn = async_fn
+        self._sync_fn = sync_fn
+        self._args = args
+        self._kwargs = kwargs
+
+    def __aiter__(self) -> AsyncIterator[Y]:
+        return self._async_fn(*self._args, **self._kwargs)
+
+    def __iter__(self) -> Iterator[Y]:
+        return self._sync_fn(*self._args, **self._kwargs)
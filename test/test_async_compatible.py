@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from easy_sync import async_compatible, sync_compatible, explain, runtime, add_hook, remove_hook, MetricsCollector
+
+request_id : contextvars.ContextVar[str] = contextvars.ContextVar('request_id', default='-')
+
+@async_compatible
+def blocking_work(x: int) -> tuple[int, int, str]:
+    time.sleep(0.1)
+    return x * 2, threading.get_ident(), request_id.get()
+
+@async_compatible(executor="process")
+def cpu_work(x: int) -> tuple[int, int]:
+    return x ** 2, os.getpid()
+
+@sync_compatible
+async def async_pipeline(x: int) -> int:
+    doubled, _, _ = await blocking_work(x)
+    return doubled + 1
+
+@sync_compatible
+async def async_fan_out(x: int) -> list[int]:
+    return list(await asyncio.gather(*[async_pipeline(x + i) for i in range(3)]))
+
+@async_compatible
+def fan_out_job(x: int) -> list[int]:
+    return async_fan_out(x).wait()
+
+
+def test_wait_calls_directly():
+    assert blocking_work(2).wait() == (4, threading.get_ident(), '-')
+
+def test_await_offloads_to_thread():
+    async def main():
+        request_id.set('r1')
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        ticker = asyncio.create_task(tick())
+        result = await asyncio.gather(blocking_work(1), blocking_work(2))
+        ticker.cancel()
+        return result, ticks
+
+    [(a, thread_a, ctx), (b, _, _)], ticks = asyncio.run(main())
+    assert (a, b, ctx) == (2, 4, 'r1')
+    assert thread_a != threading.get_ident()
+    assert ticks >= 5 # the event loop was not blocked
+
+def test_custom_executor():
+    with ThreadPoolExecutor(1, thread_name_prefix='custom') as pool:
+        @async_compatible(executor=pool)
+        def thread_name() -> str:
+            return threading.current_thread().name
+        assert asyncio.run(thread_name()).startswith('custom')
+
+def test_sync_compatible_caller():
+    assert async_pipeline(3).wait() == asyncio.run(async_pipeline(3)) == 7
+    assert "blocking_work.__sync__(x)" in explain(async_pipeline)
+
+def test_process_executor():
+    value, pid = asyncio.run(cpu_work(7))
+    assert value == 49 and pid != os.getpid()
+    assert cpu_work(3).wait() == (9, os.getpid())
+
+    with pytest.raises(Exception): # raised by the executor, the arguments are not checked beforehand
+        asyncio.run(cpu_work(lambda: 1)) #type: ignore # not picklable
+
+    with pytest.raises(TypeError):
+        @async_compatible(executor="process")
+        def nested(x: int) -> int:
+            return x
+
+def test_nested_gather_on_small_pool():
+    async def main():
+        with runtime.timeout(5): # a deadlock fails with a timeout, rather than hanging
+            return await asyncio.gather(fan_out_job(0), fan_out_job(10))
+
+    with ThreadPoolExecutor(2) as pool:
+        runtime.set_executor(pool)
+        try:
+            # both workers run a job, whose sync gather runs inline instead of waiting for a free worker
+            assert asyncio.run(main()) == [[1, 3, 5], [21, 23, 25]]
+        finally:
+            runtime.set_executor(None)
+
+def test_metrics_keyed_by_function():
+    collector = MetricsCollector()
+    add_hook(collector)
+    try:
+        assert blocking_work(1).wait()[0] == 2
+        assert asyncio.run(cpu_work(2))[0] == 4
+    finally:
+        remove_hook(collector)
+    assert set(collector.snapshot()) == {f"{__name__}.blocking_work", f"{__name__}.cpu_work"}
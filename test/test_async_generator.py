@@ -0,0 +1,43 @@
+import asyncio
+from easy_sync import sync_compatible
+
+fetched : list[int] = []
+
+@sync_compatible
+async def async_fetch_page(i: int) -> list[int]:
+    await asyncio.sleep(0.01)
+    fetched.append(i)
+    return [i * 10 + j for j in range(3)]
+
+@sync_compatible
+async def async_read_pages(n: int):
+    for i in range(n):
+        for item in await async_fetch_page(i):
+            yield item
+
+@sync_compatible
+async def async_read_evens(n: int):
+    async for item in async_read_pages(n):
+        if item % 2 == 0:
+            yield item
+
+@sync_compatible
+async def async_sum_pages(n: int) -> int:
+    return sum([item async for item in async_read_pages(n)])
+
+def test_async_generator_streaming():
+    fetched.clear()
+    pages = iter(async_read_pages(100))
+    assert next(pages) == 0
+    assert fetched == [0] # items are streamed, not collected
+
+    assert list(async_read_evens(2)) == [0, 2, 10, 12]
+    assert async_sum_pages(2).wait() == 36
+
+def test_async_generator_async_path():
+
+    async def async_main():
+        assert [x async for x in async_read_evens(2)] == [0, 2, 10, 12]
+        assert await async_sum_pages(2) == 36
+
+    asyncio.run(async_main())
@@ -0,0 +1,41 @@
+import asyncio
+from easy_sync import sync_compatible
+
+@sync_compatible(background_loop=True)
+async def async_current_loop() -> asyncio.AbstractEventLoop:
+    await asyncio.sleep(0.01)
+    return asyncio.get_running_loop()
+
+@sync_compatible(background_loop=True)
+async def async_nested_wait() -> asyncio.AbstractEventLoop:
+    # waiting synchronously while running on the background loop itself
+    return async_current_loop().wait()
+
+class Client:
+    async def fetch(self, x: int) -> int:
+        await asyncio.sleep(0.01)
+        return x * 2
+
+@sync_compatible
+async def async_fetch_twice(client: Client, x: int) -> int:
+    # `client.fetch` is not sync compatible, its coroutine runs on the background loop in the sync version
+    return await client.fetch(x) + await client.fetch(x)
+
+def test_background_loop_reused():
+    loop1 = async_current_loop().wait()
+    loop2 = async_current_loop().wait()
+    assert loop1 is loop2 and loop1.is_running()
+
+def test_background_loop_nested():
+
+    async def async_main():
+        loop = asyncio.get_running_loop()
+        assert await async_current_loop() is loop
+        assert async_current_loop().wait() is not loop # the nested case
+
+    asyncio.run(async_main())
+
+    assert async_nested_wait().wait() is not async_current_loop().wait()
+
+def test_untransformable_coroutine():
+    assert async_fetch_twice(Client(), 3).wait() == 12
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+import easy_sync.transform
+import easy_sync.code_cache
+from easy_sync import sync_compatible, sync_compatible_class
+
+@sync_compatible
+class Counter:
+    def __init__(self, start: int = 0):
+        self.__value = start
+
+    async def add(self, n: int) -> int:
+        await asyncio.sleep(0.001)
+        self.__value += n
+        return self.__value
+
+    async def add_twice(self, n: int) -> int:
+        await self.add(n)
+        return await self.add(n)
+
+    @classmethod
+    async def create(cls, start: int) -> 'Counter':
+        await asyncio.sleep(0.001)
+        return cls(start)
+
+    @staticmethod
+    async def double(x: int) -> int:
+        await asyncio.sleep(0.001)
+        return x * 2
+
+    async def count_up(self, n: int):
+        for i in range(n):
+            yield await self.add(1)
+
+    def sync_method(self) -> int:
+        return self.__value
+
+@sync_compatible_class
+class LoudCounter(Counter):
+    async def add(self, n: int) -> int:
+        return await super().add(n * 10)
+
+def test_class_methods():
+    counter = Counter.create(1).wait() #type: ignore
+    assert isinstance(counter, Counter)
+    assert counter.add(2).wait() == 3 #type: ignore
+    assert counter.add_twice(1).wait() == 5 #type: ignore
+    assert Counter.double(4).wait() == 8 #type: ignore
+    assert list(counter.count_up(2)) == [6, 7] #type: ignore
+    assert counter.sync_method() == 7
+
+    async def async_main():
+        counter = await Counter.create(1)
+        assert await counter.add_twice(1) == 3
+        assert await Counter.double(4) == 8
+        assert [x async for x in counter.count_up(2)] == [4, 5]
+
+    asyncio.run(async_main())
+
+def test_super_and_subclass():
+    counter = LoudCounter.create(0).wait() #type: ignore
+    assert isinstance(counter, LoudCounter)
+    assert counter.add(1).wait() == 10 #type: ignore
+    assert counter.add_twice(1).wait() == 30 #type: ignore # `self.add` resolves to the overridden method in both paths
+    assert counter.add.__func__ is LoudCounter.add # `super().add` doesn't shadow the override
+
+def test_bound_method_cached():
+    counter = Counter()
+    assert counter.add is counter.add
+    assert counter.add.__self__ is counter
+    assert Counter.add(counter, 1).wait() == 1 #type: ignore
+
+def test_class_parsed_once(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', False)
+    parsed : list[str] = []
+    original_parse = easy_sync.transform.ast.parse
+
+    def counting_parse(source, *args, **kwargs):
+        parsed.append(source)
+        return original_parse(source, *args, **kwargs)
+
+    monkeypatch.setattr(easy_sync.transform.ast, 'parse', counting_parse)
+
+    @sync_compatible
+    class Client:
+        async def get(self, x: int) -> int:
+            return x
+
+        async def get_many(self, xs: list[int]) -> list[int]:
+            return [await self.get(x) for x in xs]
+
+    # `inspect.getsourcelines` may parse the whole file to locate the class, only the class source counts here
+    assert len([source for source in parsed if source.startswith('@sync_compatible\nclass Client')]) == 1
+    assert Client().get_many([1, 2]).wait() == [1, 2] #type: ignore
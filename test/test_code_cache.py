@@ -0,0 +1,65 @@
+import os
+import sys
+import importlib
+import subprocess
+from pathlib import Path
+import pytest
+import easy_sync.transform
+import easy_sync.code_cache
+from easy_sync import configure_code_cache
+
+MODULE_SOURCE = '''
+import asyncio
+from easy_sync import sync_compatible
+
+@sync_compatible
+async def async_add(a: int, b: int) -> int:
+    await asyncio.sleep(0.01)
+    return a + b {extra}
+'''
+
+def _import_fresh(path: Path, extra: str = ''):
+    path.joinpath('cached_mod.py').write_text(MODULE_SOURCE.format(extra=extra))
+    sys.modules.pop('cached_mod', None)
+    return importlib.import_module('cached_mod')
+
+@pytest.fixture
+def module_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', True)
+    monkeypatch.setattr(easy_sync.code_cache, '_directory', None)
+    configure_code_cache(directory=tmp_path / 'cache')
+    yield tmp_path
+    sys.modules.pop('cached_mod', None)
+
+def test_code_cache_warm_import_skips_ast(module_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    mod = _import_fresh(module_dir)
+    assert mod.async_add(1, 2).wait() == 3
+    assert len(list((module_dir / 'cache').iterdir())) == 1
+
+    def fail_parse(*args, **kwargs):
+        raise AssertionError("ast.parse should not be called on warm import")
+
+    monkeypatch.setattr(easy_sync.transform.ast, 'parse', fail_parse)
+    mod = _import_fresh(module_dir)
+    assert mod.async_add(3, 4).wait() == 7
+
+def test_code_cache_invalidated_on_source_change(module_dir: Path):
+    mod = _import_fresh(module_dir)
+    assert mod.async_add(1, 2).wait() == 3
+
+    mod = _import_fresh(module_dir, extra='+ 100')
+    assert mod.async_add(1, 2).wait() == 103
+    assert len(list((module_dir / 'cache').iterdir())) == 1
+
+def test_code_cache_disabled(module_dir: Path):
+    configure_code_cache(enabled=False)
+    mod = _import_fresh(module_dir)
+    assert mod.async_add(1, 2).wait() == 3
+    assert not (module_dir / 'cache').exists()
+
+def test_version_looked_up_lazily():
+    # `importlib.metadata` scans the installed distributions, it must not slow the import of easy_sync down
+    code = "import sys, easy_sync; print('importlib.metadata' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    assert subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout.strip() == 'False'
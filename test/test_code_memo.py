@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+import easy_sync.transform
+from easy_sync import sync_compatible
+
+@sync_compatible
+async def async_add(a: int, b: int) -> int:
+    await asyncio.sleep(0.01)
+    return a + b
+
+@sync_compatible
+async def async_outer(x: int) -> int:
+
+    @sync_compatible
+    async def async_inner(y: int = 10) -> int:
+        return await async_add(x, y)
+
+    return await async_inner() + await async_inner(y=0)
+
+def test_nested_function_transformed_once(monkeypatch: pytest.MonkeyPatch):
+    loads : list[str] = []
+    original_load = easy_sync.transform._load_sync_code
+
+    def counting_load(func, *args):
+        loads.append(func.__qualname__)
+        return original_load(func, *args)
+
+    monkeypatch.setattr(easy_sync.transform, '_load_sync_code', counting_load)
+
+    async def async_main():
+        for i in range(5):
+            assert await async_outer(i) == 2 * i + 10
+
+    asyncio.run(async_main())
+    assert loads.count('async_outer.<locals>.async_inner') == 1
+
+def test_closure_variables():
+
+    def make_adder(n: int):
+
+        @sync_compatible
+        async def async_add_n(x: int, *, scale: int = 1) -> int:
+            await asyncio.sleep(0.01)
+            return (await async_add(x, n)) * scale
+
+        return async_add_n
+
+    add_1 = make_adder(1)
+    add_2 = make_adder(2)
+
+    assert add_1(3).wait() == 4
+    assert add_2(3).wait() == 5
+    assert add_2(3, scale=10).wait() == 50
+
+    async def async_main():
+        assert await add_2(3) == 5
+
+    asyncio.run(async_main())
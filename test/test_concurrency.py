@@ -0,0 +1,59 @@
+import asyncio
+import sys
+import time
+import pytest
+from easy_sync import sync_compatible
+
+@sync_compatible
+async def async_slow_double(x: int) -> int:
+    await asyncio.sleep(0.2)
+    if x < 0:
+        raise ValueError(x)
+    return x * 2
+
+@sync_compatible
+async def async_gather(n: int) -> list[int]:
+    return list(await asyncio.gather(*[async_slow_double(i) for i in range(n)]))
+
+@sync_compatible
+async def async_gather_errors() -> list[int | BaseException]:
+    return list(await asyncio.gather(async_slow_double(1), async_slow_double(-1), return_exceptions=True))
+
+@sync_compatible
+async def async_create_task() -> int:
+    t1 = asyncio.create_task(async_slow_double(1))
+    t2 = asyncio.create_task(async_slow_double(2))
+    return await t1 + await t2
+
+def test_gather():
+    t0 = time.perf_counter()
+    assert async_gather(4).wait() == [0, 2, 4, 6]
+    assert time.perf_counter() - t0 < 0.6
+
+    assert asyncio.run(async_gather.__wrapped__(4)) == [0, 2, 4, 6] #type: ignore
+
+    r = async_gather_errors().wait()
+    assert r[0] == 2 and isinstance(r[1], ValueError)
+
+def test_create_task():
+    t0 = time.perf_counter()
+    assert async_create_task().wait() == 6
+    assert time.perf_counter() - t0 < 0.4
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="asyncio.TaskGroup requires python 3.11+")
+def test_task_group():
+
+    @sync_compatible
+    async def async_task_group(n: int) -> list[int]:
+        async with asyncio.TaskGroup() as tg: #type: ignore
+            tasks = [tg.create_task(async_slow_double(i)) for i in range(n)]
+        return [t.result() for t in tasks]
+
+    t0 = time.perf_counter()
+    assert async_task_group(4).wait() == [0, 2, 4, 6]
+    assert time.perf_counter() - t0 < 0.6
+
+    async def async_main():
+        assert await async_task_group(2) == [0, 2]
+
+    asyncio.run(async_main())
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+import easy_sync
+from easy_sync import sync_compatible, Waitable
+
+@sync_compatible
+async def async_add(a: int, b: int) -> int:
+    await asyncio.sleep(0.01)
+    return a + b
+
+@sync_compatible
+async def async_chain(x: int) -> int:
+
+    @sync_compatible
+    async def async_nested(y: int) -> int:
+        return await async_add(y, await async_add(y, 0))
+
+    return await async_nested(x) + await async_later(x)
+
+@sync_compatible
+async def async_later(x: int) -> int:
+    ''' defined after its caller, so it is reached via `.wait()` '''
+    return x
+
+@pytest.fixture
+def waitables(monkeypatch: pytest.MonkeyPatch):
+    created : list[Waitable[int]] = []
+
+    class RecordingWaitable(Waitable[int]):
+        __slots__ = ()
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(easy_sync, 'Waitable', RecordingWaitable)
+    return created
+
+def test_sync_attribute():
+    assert async_add.__sync__(1, 2) == 3 #type: ignore
+
+def test_direct_dispatch(waitables: list[Waitable[int]]):
+    assert async_chain(5).wait() == 15
+    assert len(waitables) == 2 # async_chain itself and the not-yet-defined async_later
+
+    async def async_main():
+        assert await async_chain(5) == 15
+
+    asyncio.run(async_main())
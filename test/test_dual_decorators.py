@@ -0,0 +1,118 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from easy_sync import sync_compatible, dual_decorator, concurrency_limit, rate_limit
+
+active = 0
+peak = 0
+lock = threading.Lock()
+
+def _enter():
+    global active, peak
+    with lock:
+        active += 1
+        peak = max(peak, active)
+
+def _exit():
+    global active
+    with lock:
+        active -= 1
+
+@sync_compatible
+@concurrency_limit(2)
+async def async_limited(x: int) -> int:
+    _enter()
+    await asyncio.sleep(0.05)
+    _exit()
+    return x
+
+@sync_compatible
+@rate_limit(5, period=0.5)
+async def async_rated(x: int) -> int:
+    return x
+
+log : list[str] = []
+
+def sync_logged(fn):
+    def wrapper(*args, **kwargs):
+        log.append(f"sync {fn.__name__}")
+        return fn(*args, **kwargs)
+    return wrapper
+
+def async_logged(fn):
+    async def wrapper(*args, **kwargs):
+        log.append(f"async {fn.__name__}")
+        return await fn(*args, **kwargs)
+    wrapper.__wrapped__ = fn #type: ignore
+    return wrapper
+
+@sync_compatible
+@dual_decorator(async_logged, sync_logged)
+async def async_logged_add(a: int, b: int) -> int:
+    return a + b
+
+@sync_compatible
+async def async_call_logged_add() -> int:
+    return await async_logged_add(1, 2)
+
+@sync_compatible
+class LimitedClient:
+    @concurrency_limit(2)
+    async def fetch(self, x: int) -> int:
+        _enter()
+        await asyncio.sleep(0.05)
+        _exit()
+        return x
+
+    @dual_decorator(async_logged, sync_logged)
+    async def add(self, a: int, b: int) -> int:
+        return a + b
+
+def test_concurrency_limit():
+    global peak
+    peak = 0
+    with ThreadPoolExecutor(6) as pool:
+        assert list(pool.map(lambda x: async_limited(x).wait(), range(6))) == list(range(6))
+    assert peak == 2
+
+    peak = 0
+    async def async_main():
+        assert await asyncio.gather(*[async_limited(x) for x in range(6)]) == list(range(6))
+
+    asyncio.run(async_main())
+    asyncio.run(async_main()) # a new event loop gets its own semaphore
+    assert peak == 2
+
+def test_rate_limit():
+    start = time.perf_counter()
+    for i in range(7):
+        async_rated(i).wait()
+    assert time.perf_counter() - start >= 0.15 # the burst of 5, then 2 more at 10 per second
+
+    async def async_main():
+        start = time.perf_counter()
+        await asyncio.gather(*[async_rated(i) for i in range(3)])
+        assert time.perf_counter() - start >= 0.25 # the limit is shared with the sync version
+
+    asyncio.run(async_main())
+
+def test_dual_decorator():
+    log.clear()
+    assert async_logged_add(1, 2).wait() == 3
+    assert async_call_logged_add().wait() == 3 # also via the direct `__sync__` call
+    assert asyncio.run(async_logged_add(1, 2)) == 3 #type: ignore
+    assert log == ["sync async_logged_add__sync__", "sync async_logged_add__sync__", "async async_logged_add"]
+
+def test_decorated_methods():
+    global peak
+    peak = 0
+    client = LimitedClient()
+    with ThreadPoolExecutor(6) as pool:
+        assert list(pool.map(lambda x: client.fetch(x).wait(), range(6))) == list(range(6)) #type: ignore
+    assert peak == 2
+
+    log.clear()
+    assert client.add(1, 2).wait() == 3 #type: ignore
+    assert asyncio.run(client.add(1, 2)) == 3 #type: ignore
+    assert log == ["sync add__sync__", "async add"]
@@ -0,0 +1,86 @@
+import time
+import asyncio
+import pytest
+from easy_sync import sync_compatible, StartedWaitable
+
+started : list[int] = []
+
+@sync_compatible(eager=True)
+async def async_slow(x: int) -> int:
+    started.append(x)
+    await asyncio.sleep(0.1)
+    return x
+
+@sync_compatible
+async def async_slow_lazy(x: int) -> int:
+    await asyncio.sleep(0.1)
+    return x
+
+@sync_compatible
+async def async_sum_eagerly(n: int) -> int:
+    waitables = [async_slow(i) for i in range(n)] # started right away in both versions
+    return sum([await w for w in waitables])
+
+@sync_compatible
+async def async_deferred_await(x: int) -> int:
+    w = async_slow(x) # started here, awaited later
+    return await w
+
+async def async_slow_on_loop(x: int) -> int:
+    # the sync version waits on the thread of the running loop, as a sync function called by async code would
+    return async_deferred_await(x).wait()
+
+def test_eager_sync_path():
+    start = time.perf_counter()
+    a, b = async_slow(1), async_slow(2)
+    assert isinstance(a, StartedWaitable)
+    assert a.wait() + b.wait() == 3
+    assert time.perf_counter() - start < 0.18
+
+    start = time.perf_counter()
+    assert async_sum_eagerly(4).wait() == 6
+    assert time.perf_counter() - start < 0.3
+
+def test_eager_async_path():
+
+    async def async_main():
+        started.clear()
+        a, b = async_slow(1), async_slow(2)
+        await asyncio.sleep(0)
+        assert started == [1, 2] # both are running before being awaited
+
+        start = time.perf_counter()
+        assert await a + await b == 3
+        assert await a == 1 # awaiting again gets the same result
+        assert time.perf_counter() - start < 0.18
+
+        started.clear()
+        assert async_slow(3).wait() == 3 # the task of this loop has not started, it's cancelled and run synchronously
+        running = async_slow(4)
+        assert isinstance(running, StartedWaitable)
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            running.wait() # the task is running on this loop, waiting for it synchronously here would deadlock
+        await asyncio.sleep(0)
+        assert running._task is not None and running._task.cancelled() # not left running after the error
+        assert started == [3, 4] and await async_slow_on_loop(5) == 5
+        await asyncio.sleep(0.15)
+        assert started == [3, 4, 5] # the tasks cancelled before they started never run
+
+        assert await async_sum_eagerly(4) == 6
+
+    asyncio.run(async_main())
+
+def test_start():
+    start = time.perf_counter()
+    waitables = [async_slow_lazy(i).start() for i in range(3)]
+    assert [w.wait() for w in waitables] == [0, 1, 2]
+    assert time.perf_counter() - start < 0.25
+
+    async def async_main():
+        waitables = [async_slow_lazy(i).start() for i in range(3)]
+        return [await w for w in waitables]
+
+    start = time.perf_counter()
+    assert asyncio.run(async_main()) == [0, 1, 2]
+    assert time.perf_counter() - start < 0.25
@@ -0,0 +1,35 @@
+import asyncio
+import inspect
+import traceback
+import pytest
+from easy_sync import sync_compatible, explain
+
+@sync_compatible
+async def async_div(a: int, b: int) -> float:
+    await asyncio.sleep(0)
+    return a / b
+
+@sync_compatible
+async def async_mean(xs: list[int]) -> float:
+    return await async_div(sum(xs), len(xs))
+
+def test_explain():
+    source = explain(async_mean)
+    assert "def async_mean__sync__(xs: list[int]) -> float:" in source
+    assert "async_div.__sync__(sum(xs), len(xs))" in source
+
+    source = explain(async_div)
+    assert "from easy_sync import runtime as _easy_sync" in source and "_easy_sync.sleep(0)" in source
+
+def test_real_filename_and_line_numbers():
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        async_mean([]).wait()
+
+    frames = traceback.extract_tb(excinfo.value.__traceback__)
+    sync_frame = [f for f in frames if f.name == 'async_div__sync__'][0]
+    lines, start = inspect.getsourcelines(inspect.unwrap(async_div))
+    assert sync_frame.filename == __file__
+    assert sync_frame.lineno == start + 3
+    assert sync_frame.line == "return a / b"
+
+    assert async_div.__sync__.__code__.co_filename == __file__ #type: ignore
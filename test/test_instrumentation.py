@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from easy_sync import sync_compatible, add_hook, remove_hook, MetricsCollector, Waitable
+
+@sync_compatible
+async def async_square(x: int) -> int:
+    await asyncio.sleep(0.001)
+    return x * x
+
+@sync_compatible
+async def async_fail() -> None:
+    raise ValueError("failed")
+
+def test_metrics_collector():
+    collector = MetricsCollector()
+    add_hook(collector)
+    try:
+        @sync_compatible
+        async def async_cube(x: int) -> int:
+            return x * await async_square(x)
+
+        assert async_square(2).wait() == 4
+        assert async_cube(2).wait() == 8
+        with pytest.raises(ValueError):
+            async_fail().wait()
+
+        async def async_main():
+            assert await async_square(3) == 9
+
+        asyncio.run(async_main())
+    finally:
+        remove_hook(collector)
+
+    metrics = collector.snapshot()
+    square = metrics[f"{__name__}.async_square"]
+    assert square['calls'] == {'sync': 1, 'async': 1} # the nested call in `async_cube` goes through `__sync__` directly
+    assert sum(square['histogram']['async']) == 1 and square['total_time']['async'] >= 0.001
+    assert metrics[f"{__name__}.async_fail"]['errors'] == {'sync': 1, 'async': 0}
+    assert metrics[f"{__name__}.test_metrics_collector.<locals>.async_cube"]['transform_time'] > 0
+
+def test_disabled_by_default():
+    assert Waitable.wait.__name__ == 'wait' and Waitable.__await__.__name__ == '__await__'
+
+def test_shared_and_started_waitables():
+    collector = MetricsCollector()
+    add_hook(collector)
+    try:
+        shared = async_square(4).shared()
+        assert shared.wait() == shared.wait() == 16
+        assert async_square(5).start().wait() == 25
+
+        async def async_main():
+            assert await async_square(6).start() == 36
+            assert await async_square(7).shared() == 49
+
+        asyncio.run(async_main())
+    finally:
+        remove_hook(collector)
+
+    square = collector.snapshot()[f"{__name__}.async_square"]
+    assert square['calls'] == {'sync': 3, 'async': 2} # every wait and await of the consumers, once each
@@ -0,0 +1,49 @@
+import asyncio
+import easy_sync
+import easy_sync as es
+from easy_sync import sync_compatible, explain, IS_SYNC
+
+@sync_compatible
+async def async_mode() -> str:
+    if easy_sync.IS_SYNC:
+        mode = "sync"
+    else:
+        await asyncio.sleep(0)
+        mode = "async"
+    return mode
+
+@sync_compatible
+async def async_mode_negated() -> str:
+    if not IS_SYNC:
+        return "async"
+    return "sync" if IS_SYNC else "unreachable"
+
+@sync_compatible
+async def async_mode_aliased() -> str:
+    return "sync" if es.IS_SYNC else "async"
+
+@sync_compatible
+async def async_shadowed(IS_SYNC: bool) -> str:
+    return "on" if IS_SYNC else "off"
+
+
+def test_is_sync():
+    assert async_mode().wait() == "sync"
+    assert asyncio.run(async_mode()) == "async"
+    assert async_mode_negated().wait() == "sync"
+    assert asyncio.run(async_mode_negated()) == "async"
+
+def test_is_sync_folded():
+    source = explain(async_mode).split("@sync_compatible")[0]
+    assert "IS_SYNC" not in source and "sleep" not in source and "_easy_sync" not in source
+    source = explain(async_mode_negated).split("@sync_compatible")[0]
+    assert "IS_SYNC" not in source and "unreachable" not in source
+
+def test_is_sync_resolved():
+    assert async_mode_aliased().wait() == "sync"
+    assert asyncio.run(async_mode_aliased()) == "async"
+    assert "IS_SYNC" not in explain(async_mode_aliased).split("@sync_compatible")[0]
+
+    assert async_shadowed(False).wait() == "off" # a parameter shadows `easy_sync.IS_SYNC`, not folded
+    assert async_shadowed(True).wait() == "on"
+    assert "IS_SYNC" in explain(async_shadowed).split("@sync_compatible")[0]
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import threading
+import pytest
+import easy_sync
+import easy_sync.transform
+from easy_sync import sync_compatible, warmup
+
+@sync_compatible(lazy=True)
+async def async_add(a: int, b: int) -> int:
+    await asyncio.sleep(0.01)
+    return a + b
+
+@sync_compatible(lazy=True)
+async def async_double(x: int) -> int:
+
+    @sync_compatible(lazy=True)
+    async def async_nested(y: int) -> int:
+        return await async_add(y, y)
+
+    return await async_nested(x)
+
+@pytest.fixture
+def transformed(monkeypatch: pytest.MonkeyPatch):
+    names : list[str] = []
+    original = easy_sync.transform.transform_function_to_sync
+
+    def recording_transform(func):
+        names.append(func.__name__)
+        return original(func)
+
+    monkeypatch.setattr(easy_sync, 'transform_function_to_sync', recording_transform)
+    return names
+
+def test_lazy_transformation(transformed: list[str]):
+
+    @sync_compatible(lazy=True)
+    async def async_sub(a: int, b: int) -> int:
+        return a - b
+
+    assert transformed == []
+
+    async def async_main():
+        assert await async_sub(3, 1) == 2
+
+    asyncio.run(async_main())
+    assert transformed == []
+
+    assert async_sub(3, 1).wait() == 2
+    assert async_sub(5, 1).wait() == 4
+    assert transformed == ['async_sub']
+
+def test_lazy_transformation_thread_safe(transformed: list[str]):
+
+    @sync_compatible(lazy=True)
+    async def async_mul(a: int, b: int) -> int:
+        return a * b
+
+    results : list[int] = []
+    threads = [threading.Thread(target=lambda i=i: results.append(async_mul(i, 2).wait())) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == [i * 2 for i in range(8)]
+    assert transformed == ['async_mul']
+
+def test_warmup(transformed: list[str]):
+    assert warmup(sys.modules[__name__]) == 2
+    assert sorted(transformed) == ['async_add', 'async_double']
+    assert async_double(4).wait() == 8
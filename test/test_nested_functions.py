@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from easy_sync import sync_compatible, explain
+from easy_sync.transform import transform_function_to_sync
+
+async def async_outer(x: int) -> int:
+    @sync_compatible
+    async def async_middle(y: int) -> int:
+        async def async_inner(z: int) -> int:
+            await asyncio.sleep(0)
+            return z * 2
+        return await async_inner(y) + 1
+    return await async_middle(x) + await async_middle(x + 1)
+
+@sync_compatible
+async def async_shadowed(x: int) -> int:
+    await asyncio.sleep(0)
+    return x + 100
+
+async def async_sibling_scopes(x: int) -> int:
+    async def async_first(y: int) -> int:
+        @sync_compatible
+        async def async_shadowed(z: int) -> int:
+            return z
+        return await async_shadowed(y)
+
+    async def async_second(y: int) -> int:
+        return await async_shadowed(y) # the global function, not the one nested in the sibling
+
+    async def async_rebound(y: int) -> int:
+        async_first = async_shadowed
+        return await async_first(y) # rebound in this scope, not the nested function of the enclosing one
+
+    return await async_first(x) + await async_second(x) + await async_rebound(x)
+
+
+def test_deeply_nested_functions(capsys: pytest.CaptureFixture[str]):
+    sync_outer = transform_function_to_sync(async_outer)
+    assert capsys.readouterr().out == "" # nothing printed while transforming
+
+    assert sync_outer(1) == asyncio.run(async_outer(1)) == 3 + 5
+
+    source = explain(async_outer)
+    assert "return async_inner__sync__(y) + 1" in source
+    # the async version of the nested function keeps its original body
+    assert "return await async_inner(y) + 1" in source
+
+def test_sibling_scopes():
+    sync_fn = transform_function_to_sync(async_sibling_scopes)
+    assert sync_fn(1) == asyncio.run(async_sibling_scopes(1)) == 1 + 101 + 101
+
+    source = explain(async_sibling_scopes)
+    assert source.count("async_shadowed__sync__(y)") == 1 and "async_first__sync__(y)" not in source
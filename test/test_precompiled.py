@@ -0,0 +1,94 @@
+import sys
+import compileall
+import importlib
+from pathlib import Path
+import pytest
+import easy_sync.transform
+import easy_sync.code_cache
+from easy_sync import precompiled
+from easy_sync.compile import main
+
+HELPERS_SOURCE = '''
+import asyncio
+from easy_sync import sync_compatible
+
+@sync_compatible
+async def async_double(x: int) -> int:
+    await asyncio.sleep(0.01)
+    return x * 2
+'''
+
+API_SOURCE = '''
+from easy_sync import sync_compatible
+from .helpers import async_double
+
+@sync_compatible(lazy=True)
+async def async_quadruple(x: int) -> int:
+    return await async_double(await async_double(x)) {extra}
+'''
+
+def _write_package(root: Path, extra: str = ''):
+    package = root / 'aot_pkg'
+    package.mkdir(exist_ok=True)
+    (package / '__init__.py').write_text('')
+    (package / 'helpers.py').write_text(HELPERS_SOURCE)
+    (package / 'api.py').write_text(API_SOURCE.format(extra=extra))
+    return package
+
+def _forget_package():
+    for name in [n for n in sys.modules if n == 'aot_pkg' or n.startswith('aot_pkg.')]:
+        del sys.modules[name]
+    for name in [n for n in precompiled._artifacts if n == 'aot_pkg' or n.startswith('aot_pkg.')]:
+        del precompiled._artifacts[name]
+    easy_sync.transform._sync_code_memo.clear()
+
+@pytest.fixture
+def package_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', False)
+    yield tmp_path
+    _forget_package()
+
+def test_compile_and_check(package_root: Path):
+    package = _write_package(package_root)
+    assert main(['aot_pkg']) == 0
+    assert (package / '__easy_sync__.py').exists()
+    assert main(['aot_pkg', '--check']) == 0
+
+    _forget_package()
+    _write_package(package_root, extra='+ 0')
+    assert main(['aot_pkg', '--check']) == 1
+
+def fail_parse(*args, **kwargs):
+    raise AssertionError("ast.parse should not be called with precompiled code")
+
+def _make_sourceless(root: Path):
+    ''' a sourceless build, where `inspect.getsource` fails '''
+    compileall.compile_dir(str(root), legacy=True, quiet=1)
+    for path in root.rglob('*.py'):
+        path.unlink()
+
+def test_sourceless_import(package_root: Path, monkeypatch: pytest.MonkeyPatch):
+    package = _write_package(package_root)
+    assert main(['aot_pkg']) == 0
+    _forget_package()
+    _make_sourceless(package)
+
+    monkeypatch.setattr(easy_sync.transform.ast, 'parse', fail_parse)
+    api = importlib.import_module('aot_pkg.api')
+    assert api.async_quadruple(3).wait() == 12
+    assert api.async_quadruple.__sync__.__code__.co_filename.endswith('api.py')
+
+def test_subpackage(package_root: Path, monkeypatch: pytest.MonkeyPatch):
+    package = package_root / 'aot_pkg'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    subpackage = _write_package(package)
+    assert main(['aot_pkg.aot_pkg']) == 0
+    assert (subpackage / '__easy_sync__.py').exists() and not (package / '__easy_sync__.py').exists()
+    _forget_package()
+    _make_sourceless(subpackage)
+
+    monkeypatch.setattr(easy_sync.transform.ast, 'parse', fail_parse)
+    helpers = importlib.import_module('aot_pkg.aot_pkg.helpers')
+    assert helpers.async_double(3).wait() == 6
@@ -0,0 +1,108 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from easy_sync import sync_compatible, ResultCache
+
+calls : list[int] = []
+
+@sync_compatible(cache=True)
+async def async_lookup(key: int) -> int:
+    calls.append(key)
+    await asyncio.sleep(0.05)
+    return key * 10
+
+@sync_compatible(cache=ResultCache(maxsize=2, ttl=0.1))
+async def async_small_lookup(key: int) -> int:
+    calls.append(key)
+    return key
+
+@sync_compatible(cache=True)
+async def async_slow_lookup(key: int) -> int:
+    await asyncio.sleep(0.5)
+    return key
+
+@sync_compatible(cache=True)
+async def async_flaky(key: int) -> int:
+    calls.append(key)
+    await asyncio.sleep(0.01)
+    raise ValueError(key)
+
+def test_shared_by_sync_and_async():
+    calls.clear()
+    assert async_lookup(1).wait() == 10
+
+    async def async_main():
+        assert await async_lookup(1) == 10
+
+    asyncio.run(async_main())
+    assert calls == [1]
+
+def test_single_flight():
+    calls.clear()
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(lambda _: async_lookup(2).wait(), range(8))) == [20] * 8
+    assert calls == [2]
+
+    async def async_main():
+        assert await asyncio.gather(*[async_lookup(3) for _ in range(8)]) == [30] * 8
+
+    asyncio.run(async_main())
+    assert calls == [2, 3]
+
+def test_sync_waits_for_async_flight():
+    calls.clear()
+    results : list[int] = []
+
+    async def async_main():
+        task = asyncio.create_task(async_lookup(4))
+        await asyncio.sleep(0.01) # the flight has started
+        thread = threading.Thread(target=lambda: results.append(async_lookup(4).wait()))
+        thread.start()
+        assert await task == 40
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(async_main())
+    assert results == [40] and calls == [4]
+
+def test_lru_and_ttl():
+    calls.clear()
+    for key in [1, 2, 1, 3, 1, 2]:
+        async_small_lookup(key).wait()
+    assert calls == [1, 2, 3, 2] # 2 is evicted by 3, while 1 is recently used
+
+    time.sleep(0.15)
+    async_small_lookup(1).wait()
+    assert calls == [1, 2, 3, 2, 1]
+
+def test_errors_not_cached():
+    calls.clear()
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(lambda: async_flaky(5).wait()) for _ in range(4)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert calls == [5]
+
+    with pytest.raises(ValueError):
+        async_flaky(5).wait()
+    assert calls == [5, 5]
+
+def test_unhashable_arguments():
+    @sync_compatible(cache=True)
+    async def async_total(xs: list[int]) -> int:
+        return sum(xs)
+
+    assert async_total([1, 2]).wait() == 3
+    assert async_total([1, 2]).wait() == 3
+
+def test_single_flight_waiter_deadline():
+    with ThreadPoolExecutor(1) as pool:
+        owner = pool.submit(lambda: async_slow_lookup(1).wait())
+        time.sleep(0.05) # the owner of the flight is running
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            async_slow_lookup(1).wait(timeout=0.05)
+        assert time.perf_counter() - start < 0.3
+        assert owner.result() == 1
@@ -0,0 +1,63 @@
+import time
+import asyncio
+import threading
+import pytest
+from easy_sync import sync_compatible, run_many
+
+active = 0
+peak = 0
+lock = threading.Lock()
+
+@sync_compatible
+async def async_delayed(x: int, delay: float) -> int:
+    global active, peak
+    with lock:
+        active += 1
+        peak = max(peak, active)
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        with lock:
+            active -= 1
+    if x < 0:
+        raise ValueError(x)
+    return x
+
+
+def reset_peak() -> None:
+    global peak
+    peak = 0
+
+
+def test_run_many_threads():
+    reset_peak()
+    delays = [0.05, 0.01, 0.03, 0.02] * 3
+    results = list(run_many((async_delayed(i, d) for i, d in enumerate(delays)), max_concurrency=4))
+    assert results == list(range(len(delays)))
+    assert peak == 4
+
+    results = list(run_many([async_delayed(i, d) for i, d in enumerate([0.1, 0.01])], max_concurrency=2, ordered=False))
+    assert results == [1, 0]
+
+def test_run_many_async():
+    async def main(ordered: bool) -> list[int]:
+        return [x async for x in run_many([async_delayed(i, d) for i, d in enumerate([0.1, 0.01, 0.05])], max_concurrency=2, mode="async", ordered=ordered)]
+
+    reset_peak()
+    assert asyncio.run(main(True)) == [0, 1, 2]
+    assert peak == 2
+    assert asyncio.run(main(False)) == [1, 2, 0]
+
+def test_run_many_errors():
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        list(run_many([async_delayed(-1, 0.01)] + [async_delayed(i, 0.05) for i in range(20)], max_concurrency=2))
+    assert time.perf_counter() - start < 0.5 # the rest is dropped
+
+    async def main():
+        return [x async for x in run_many([async_delayed(0, 0.01), async_delayed(-1, 0.01)], mode="async")]
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+    with pytest.raises(ValueError):
+        run_many([], max_concurrency=0)
@@ -0,0 +1,57 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from easy_sync import sync_compatible, SharedWaitable
+
+calls : list[int] = []
+
+@sync_compatible
+async def async_fetch(x: int) -> int:
+    calls.append(x)
+    await asyncio.sleep(0.05)
+    return x * 2
+
+@sync_compatible
+async def async_fail(x: int) -> int:
+    calls.append(x)
+    await asyncio.sleep(0.01)
+    raise ValueError(x)
+
+def test_shared_across_threads():
+    calls.clear()
+    shared = async_fetch(1).shared()
+    assert isinstance(shared, SharedWaitable) and shared.shared() is shared
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(lambda _: shared.wait(), range(8))) == [2] * 8
+    assert shared.wait() == 2
+    assert calls == [1]
+
+def test_shared_across_tasks():
+    calls.clear()
+
+    async def async_main():
+        shared = async_fetch(2).shared()
+        assert await asyncio.gather(shared, shared, shared) == [4, 4, 4]
+        assert await shared == 4
+        assert await asyncio.to_thread(shared.wait) == 4 # a sync consumer after the async one
+
+    asyncio.run(async_main())
+    assert calls == [2]
+
+def test_shared_exception():
+    calls.clear()
+    shared = async_fail(3).shared()
+    with ThreadPoolExecutor(4) as pool:
+        for future in [pool.submit(shared.wait) for _ in range(4)]:
+            with pytest.raises(ValueError):
+                future.result()
+    with pytest.raises(ValueError):
+        shared.wait()
+    assert calls == [3]
+
+def test_plain_waitable_repeats():
+    calls.clear()
+    waitable = async_fetch(4)
+    waitable.wait()
+    waitable.wait()
+    assert calls == [4, 4]
@@ -21,3 +21,10 @@ def test_simple_case():
         print(result)
 
     asyncio.run(async_main())
+
+def test_thunk_style_waitable():
+    from easy_sync import Waitable
+
+    waitable = Waitable(async_thunk=lambda: async_add(1, 2), sync_thunk=lambda: 3)
+    assert waitable.wait() == 3
+    assert asyncio.run(Waitable(async_thunk=lambda: async_add(1, 2), sync_thunk=lambda: 3)) == 3
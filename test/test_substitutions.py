@@ -0,0 +1,117 @@
+import sys
+import asyncio
+import importlib
+from asyncio import sleep
+import threading
+from pathlib import Path
+from collections.abc import Awaitable, Callable
+import pytest
+import easy_sync.substitutions
+from easy_sync import sync_compatible, register_substitution, unregister_substitution, explain
+
+@sync_compatible
+async def async_producer_consumer(n: int) -> list[int]:
+    queue = asyncio.Queue()
+    lock = asyncio.Lock()
+    done = asyncio.Event()
+    results : list[int] = []
+
+    for i in range(n):
+        await queue.put(i)
+
+    while not queue.empty():
+        async with lock:
+            results.append(await queue.get())
+        await sleep(0.001)
+
+    done.set()
+    await done.wait()
+    return results
+
+def test_asyncio_primitives():
+    assert async_producer_consumer(3).wait() == [0, 1, 2]
+
+    async def async_main():
+        assert await async_producer_consumer(3) == [0, 1, 2]
+
+    asyncio.run(async_main())
+
+class AsyncConnection:
+    async def query(self, sql: str) -> str:
+        return f"async: {sql}"
+
+    async def __aenter__(self) -> 'AsyncConnection':
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        pass
+
+class SyncConnection:
+    def query(self, sql: str) -> str:
+        return f"sync[{threading.current_thread().name}]: {sql}"
+
+    def __enter__(self) -> 'SyncConnection':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+def test_custom_substitution():
+    register_substitution(AsyncConnection, SyncConnection)
+    try:
+
+        @sync_compatible
+        async def async_query(sql: str) -> str:
+            async with AsyncConnection() as conn:
+                return await conn.query(sql)
+
+        assert async_query("select 1").wait() == "sync[MainThread]: select 1"
+
+        async def async_main():
+            assert await async_query("select 1") == "async: select 1"
+
+        asyncio.run(async_main())
+    finally:
+        unregister_substitution(AsyncConnection)
+
+async def async_plain_double(x: int) -> int: # not sync compatible
+    await asyncio.sleep(0)
+    return x * 2
+
+@sync_compatible
+async def async_apply(callback: Callable[[int], Awaitable[int]], x: int) -> int:
+    return await callback(x) + 1
+
+def test_await_plain_coroutine_function():
+    assert async_apply(async_plain_double, 3).wait() == 7 # the coroutine runs on the background loop
+    assert asyncio.run(async_apply(async_plain_double, 3)) == 7
+    assert "_easy_sync.resolve(callback(x))" in explain(async_apply)
+
+def test_unresolved_specs_retried_on_import(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    tmp_path.joinpath('late_async_lib.py').write_text("async def fetch():\n    return 1\n")
+    tmp_path.joinpath('unrelated_lib.py').write_text("")
+    resolves : list[str] = []
+    original_resolve = easy_sync.substitutions._resolve_loaded
+
+    def counting_resolve(spec: str):
+        resolves.append(spec)
+        return original_resolve(spec)
+
+    monkeypatch.setattr(easy_sync.substitutions, '_resolve_loaded', counting_resolve)
+    register_substitution("late_async_lib.fetch", "builtins:len")
+    try:
+        version, index = easy_sync.substitutions.substitution_index()
+        resolves.clear()
+        importlib.import_module('unrelated_lib') # importing another module doesn't retry the entries
+        for _ in range(100):
+            assert easy_sync.substitutions.substitution_index()[0] == version
+        assert resolves == []
+
+        late_async_lib = importlib.import_module('late_async_lib')
+        new_version, index = easy_sync.substitutions.substitution_index()
+        assert new_version != version and id(late_async_lib.fetch) in index
+    finally:
+        unregister_substitution("late_async_lib.fetch")
+        for name in ('late_async_lib', 'unrelated_lib'):
+            sys.modules.pop(name, None)
@@ -0,0 +1,52 @@
+import os
+import asyncio
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import easy_sync.code_cache
+import easy_sync.transform
+from easy_sync import sync_compatible
+from easy_sync.transform import transform_function_to_sync
+
+THREADS = 8
+
+async def async_triple(x: int) -> int:
+    await asyncio.sleep(0)
+    return x * 3
+
+@sync_compatible
+async def async_inc(x: int) -> int:
+    return x + 1
+
+
+def run_together(fn, n: int = THREADS) -> list:
+    barrier = threading.Barrier(n)
+    def task(i: int):
+        barrier.wait()
+        return fn(i)
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(task, range(n)))
+
+
+def test_racing_transformations_share_one_entry(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', False)
+    easy_sync.transform._sync_code_memo.clear()
+
+    sync_fns = run_together(lambda _: transform_function_to_sync(async_triple))
+    assert len({fn.__code__ for fn in sync_fns}) == 1
+    assert [fn(i) for i, fn in enumerate(sync_fns)] == [i * 3 for i in range(THREADS)]
+
+def test_racing_cache_writers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', True)
+    monkeypatch.setattr(easy_sync.code_cache, '_directory', str(tmp_path))
+
+    payload = (b'x' * 100_000, ())
+    run_together(lambda _: easy_sync.code_cache.store('mod.py', 'f', 'source', payload))
+    assert easy_sync.code_cache.load('mod.py', 'f', 'source') == payload
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_parallel_waits():
+    assert run_together(lambda i: sum(async_inc(j).wait() for j in range(1000 * i, 1000 * (i + 1)))) == [
+        sum(range(1000 * i + 1, 1000 * (i + 1) + 1)) for i in range(THREADS)
+    ]
@@ -0,0 +1,107 @@
+import sys
+import queue
+import asyncio
+import threading
+import time
+import pytest
+from easy_sync import sync_compatible, deadline
+
+@sync_compatible
+async def async_slow(x: int) -> int:
+    await asyncio.sleep(1)
+    return x
+
+@sync_compatible
+async def async_fast(x: int) -> int:
+    await asyncio.sleep(0.01)
+    return x
+
+@sync_compatible
+async def async_chain(x: int) -> int:
+    a = await async_fast(x)
+    b = await async_slow(x)
+    return a + b
+
+@sync_compatible
+async def async_parallel(x: int) -> list[int]:
+    return list(await asyncio.gather(async_fast(x), async_slow(x)))
+
+@sync_compatible
+async def async_bounded(x: int) -> int:
+    async with asyncio.timeout(0.05): #type: ignore # python 3.11+, only the async version needs it
+        return await async_slow(x)
+
+@sync_compatible
+async def async_wait_for(x: int) -> int:
+    return await asyncio.wait_for(async_slow(x), 0.05)
+
+@sync_compatible
+async def async_get(q: asyncio.Queue[int]) -> int:
+    return await asyncio.wait_for(q.get(), timeout=0.05)
+
+@sync_compatible
+async def async_wait_event(event: asyncio.Event) -> bool:
+    return await asyncio.wait_for(event.wait(), 0.05)
+
+@sync_compatible
+async def async_fallback(x: int) -> int:
+    try:
+        return await asyncio.wait_for(async_slow(x), 0.05)
+    except asyncio.TimeoutError: # not the builtin one before python 3.11
+        return -1
+
+@sync_compatible
+async def async_relaxed(x: int) -> int:
+    async with asyncio.timeout(10): #type: ignore # python 3.11+, only the async version needs it
+        return await async_fast(x)
+
+
+def assert_times_out(fn, limit: float = 0.5) -> None:
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        fn()
+    assert time.perf_counter() - start < limit
+
+
+def test_wait_timeout():
+    assert async_fast(1).wait(timeout=1) == 1
+    assert_times_out(lambda: async_slow(1).wait(timeout=0.05))
+    assert_times_out(lambda: async_chain(1).wait(timeout=0.05))
+    assert deadline.get_deadline() is None
+
+def test_deadline_reaches_thread_pool():
+    assert_times_out(lambda: async_parallel(1).wait(timeout=0.05))
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="asyncio.timeout is new in python 3.11")
+def test_translated_timeouts():
+    assert_times_out(lambda: async_bounded(1).wait())
+    assert_times_out(lambda: async_wait_for(1).wait())
+    with pytest.raises(TimeoutError):
+        asyncio.run(async_bounded(1))
+
+def test_wait_for_blocking_primitives():
+    # the call is deferred until the deadline is set, and given the remaining time as its timeout
+    assert_times_out(lambda: async_get(queue.Queue()).wait()) #type: ignore
+    q : queue.Queue[int] = queue.Queue()
+    q.put(1)
+    assert async_get(q).wait() == 1 #type: ignore
+    assert_times_out(lambda: async_wait_event(threading.Event()).wait()) #type: ignore
+    event = threading.Event()
+    event.set()
+    assert async_wait_event(event).wait() is True #type: ignore
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(async_get(asyncio.Queue()))
+
+def test_caught_as_asyncio_timeout_error():
+    assert async_fallback(1).wait() == asyncio.run(async_fallback(1)) == -1
+    with pytest.raises(asyncio.TimeoutError):
+        async_slow(1).wait(timeout=0.05)
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="asyncio.timeout is new in python 3.11")
+def test_nested_deadline_cannot_extend_outer():
+    assert async_relaxed(2).wait(timeout=1) == 2
+    with deadline.timeout(0.05):
+        assert_times_out(lambda: async_slow(3).wait(timeout=10))
+    assert deadline.get_deadline() is None
+    assert async_fast(4).wait() == 4 # the deadline is gone after the block
@@ -0,0 +1,105 @@
+import sys
+import inspect
+import importlib
+from pathlib import Path
+import pytest
+import easy_sync.transform
+import easy_sync.code_cache
+
+BATCH_MODULE_SOURCE = '''
+import asyncio
+from easy_sync import sync_compatible
+
+__easy_sync_batch__ = True
+
+@sync_compatible
+async def async_inc(x: int) -> int:
+    await asyncio.sleep(0)
+    return x + 1
+''' + "".join(f'''
+@sync_compatible
+async def async_inc_{i}(x: int) -> int:
+    return await async_inc(x) + {i}
+''' for i in range(20))
+
+LAZY_MODULE_SOURCE = '''
+from easy_sync import sync_compatible, transform_module
+
+@sync_compatible(lazy=True)
+async def async_one() -> int:
+    return 1
+
+@sync_compatible(lazy=True)
+async def async_two() -> int:
+    return await async_one() + await async_one()
+
+transform_module(__name__)
+'''
+
+CLOSURE_MODULE_SOURCE = '''
+from easy_sync import sync_compatible, transform_module
+
+def make_adder(n: int):
+    @sync_compatible(lazy=True)
+    async def async_add(x: int) -> int:
+        return x + n
+    return async_add
+
+add_1 = make_adder(1)
+add_2 = make_adder(2)
+
+transform_module(__name__)
+'''
+
+@pytest.fixture
+def counting(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', False)
+    calls = {'parse': 0, 'getsource': 0}
+    original_parse = easy_sync.transform.ast.parse
+
+    def counting_parse(*args, **kwargs):
+        calls['parse'] += 1
+        return original_parse(*args, **kwargs)
+
+    def failing_getsource(*args, **kwargs):
+        raise AssertionError("inspect.getsource should not be called in the batch mode")
+
+    monkeypatch.setattr(easy_sync.transform.ast, 'parse', counting_parse)
+    monkeypatch.setattr(easy_sync.transform.inspect, 'getsource', failing_getsource)
+    yield tmp_path, calls
+    for name in ('batch_mod', 'lazy_batch_mod'):
+        sys.modules.pop(name, None)
+
+def test_batch_module(counting):
+    tmp_path, calls = counting
+    tmp_path.joinpath('batch_mod.py').write_text(BATCH_MODULE_SOURCE)
+    mod = importlib.import_module('batch_mod')
+    assert calls['parse'] == 0 # nothing is transformed at import
+
+    assert mod.async_inc_3(1).wait() == 5
+    assert calls['parse'] == 1
+    assert mod.async_inc_19(1).wait() == 21
+    assert calls['parse'] == 1
+    assert mod.async_inc_19.__sync__.__name__ == 'async_inc_19__sync__' # resolved, later direct calls skip the lazy trampoline
+    assert inspect.unwrap(mod.async_inc_19).__code__.co_filename == mod.async_inc_19.__sync__.__code__.co_filename
+
+def test_transform_module(counting):
+    tmp_path, calls = counting
+    tmp_path.joinpath('lazy_batch_mod.py').write_text(LAZY_MODULE_SOURCE)
+    mod = importlib.import_module('lazy_batch_mod')
+    assert calls['parse'] == 1
+    assert mod.async_two().wait() == 2
+    assert calls['parse'] == 1
+
+def test_module_level_closures(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(easy_sync.code_cache, '_enabled', False)
+    tmp_path.joinpath('closure_mod.py').write_text(CLOSURE_MODULE_SOURCE)
+    try:
+        mod = importlib.import_module('closure_mod')
+        assert mod.add_1(1).wait() == 2
+        assert mod.add_2(1).wait() == 3
+        assert mod.make_adder(3)(1).wait() == 4 # the closures share the memo entry, each with its own cells
+    finally:
+        sys.modules.pop('closure_mod', None)